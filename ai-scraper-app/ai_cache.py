@@ -0,0 +1,117 @@
+"""Persistent memo of AI extraction results.
+
+Results are keyed by a hash of everything that reaches the model (model name,
+system prompt and the user prompt built from content + instruction), so an
+identical request is answered from SQLite instead of a new chat completion.
+The database is opened on first use, so importing the app creates no file.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+# --- Cache Configuration (override via environment) ---
+AI_CACHE_PATH = os.getenv(
+    "AI_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_cache.sqlite3"),
+)
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "10000"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Values accepted for the `cache` field of the /extract body
+CACHE_MODES = ("bypass", "prefer", "only")
+
+# Eviction is a table scan, so only run it every so many writes
+PRUNE_EVERY = 100
+
+
+def make_key(model, system_prompt, user_prompt):
+    h = hashlib.sha256()
+    for part in (model, system_prompt, user_prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed result store with TTL and least-recently-used eviction."""
+
+    def __init__(self, path=AI_CACHE_PATH, max_entries=AI_CACHE_MAX_ENTRIES, ttl=AI_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self):
+        # Called with the lock held; sqlite3 is imported here so app startup skips it
+        if self._conn is None:
+            import sqlite3
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db().execute(
+                "SELECT result, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, model, result):
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO results (key, model, result, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(result), now, now),
+            )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                self._prune(now)
+            self._conn.commit()
+
+    def _prune(self, now):
+        self._conn.execute("DELETE FROM results WHERE created_at <= ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM results WHERE key IN ("
+            " SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        with self._lock:
+            if self._conn is None and not os.path.exists(self.path):
+                entries = 0  # Nothing cached yet; don't create the file just to count it
+            else:
+                (entries,) = self._db().execute("SELECT COUNT(*) FROM results").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,137 +1,646 @@
+"""AI scraper API: scrape a page, then extract structured JSON with OpenAI.
+
+Importing this module is kept cheap for cold starts: Flask, requests,
+BeautifulSoup and openai are imported on first use, and the OpenAI client is
+built by get_client() on the first extraction. Build the web app with
+create_app() (Flask's CLI and WSGI servers pick it up: `gunicorn "app:create_app()"`).
+
+    python app.py serve [--host H] [--port P] [--debug]
+    python app.py selftest [--live]
+"""
+
 import os
 import json
-import requests
-from bs4 import BeautifulSoup
-from flask import Flask, request, jsonify, render_template
+import sys
+import threading
 
 # --- Dependency Check and Environment Loading ---
 # You MUST run: pip install python-dotenv openai requests beautifulsoup4
+# Optional faster parsers (used by auto only if they match the fixtures; see parsers.py): pip install lxml selectolax
+# Loaded before the local modules below so their os.getenv settings see .env values
 try:
     from dotenv import load_dotenv 
     load_dotenv()
 except ImportError:
     print("FATAL ERROR: python-dotenv not installed. Run 'pip install python-dotenv'.")
 
+from ai_cache import CACHE_MODES, ResultCache, make_key
+from batch import BatchRunner, RateLimiter, validate_jobs
+from chunking import STRATEGIES, count_tokens, first_chunk, map_reduce_extract, planned_tokens
+from compaction import COMPACT_READ_FACTOR, Compactor
+from crawler import (CRAWL_DEPTH_LIMIT, CRAWL_MAX_DEPTH, CRAWL_MAX_PAGES, CRAWL_PAGE_LIMIT, ROBOTS_MAX_BYTES, Crawler,
+                     RobotsCache)
+from jobs import JobQueue, QueueFull
+from near_dup import NearDupIndex
+from metrics import (BYTES_DOWNLOADED, CACHE_EVENTS, CHARS_EXTRACTED, COMPACTION_LINES, COMPACTION_TOKENS, ERRORS,
+                     EXTRACT_SOURCES, REQUESTS, TOKENS, TRUNCATED_PAGES, CONTENT_TYPE as METRICS_CONTENT_TYPE, render as render_metrics, stage, track_request)
+from http_pool import SessionPool
+from parse_pool import ParseExecutor
+from scrape_cache import build_default_cache, conditional_headers, is_cacheable, normalize_url
+from streaming_parse import read_capped, stream_text
+from structured import (EXTRACT_MODE, MODES as EXTRACT_MODES, answer as answer_from_metadata, extract_metadata,
+                        requested_fields)
+
 # --- OpenAI Client Initialization ---
+# Built on first use by get_client(); importing openai dominates cold start.
+# Tests and benchmarks may assign `client` directly to swap in a fake.
 client = None 
-try:
-    from openai import OpenAI
-    
-    # 1. Check if the key exists after loading the .env file
-    if not os.getenv("OPENAI_API_KEY"):
-        raise ValueError("OPENAI_API_KEY environment variable is not set. Check your .env file.")
+_client_attempted = False
+_client_lock = threading.Lock()
+
+def get_client():
+    """Returns the OpenAI client, creating it on the first call (None if setup failed)."""
+    global client, _client_attempted
+    if client is None and not _client_attempted:
+        with _client_lock:
+            if client is None and not _client_attempted:
+                client = _init_client()
+                _client_attempted = True
+    return client
+
+def _init_client():
+    try:
+        from openai import OpenAI
         
-    # 2. Initialize the client (it automatically picks up the key from the environment)
-    client = OpenAI()
-    print("✅ OpenAI client initialized successfully.")
-    
-except Exception as e:
-    # This block captures any failure during setup (missing key, incorrect import, etc.)
-    print("\n" + "="*70)
-    print(f"❌ CRITICAL ERROR: OpenAI Client Initialization Failed")
-    print(f"Error Type: {type(e).__name__}")
-    print(f"Error Detail: {e}")
-    print("="*70 + "\n")
-    client = None
+        # 1. Check if the key exists after loading the .env file
+        if not os.getenv("OPENAI_API_KEY"):
+            raise ValueError("OPENAI_API_KEY environment variable is not set. Check your .env file.")
+            
+        # 2. Initialize the client (it automatically picks up the key from the environment)
+        new_client = OpenAI()
+        print("✅ OpenAI client initialized successfully.")
+        return new_client
+        
+    except Exception as e:
+        # This block captures any failure during setup (missing key, incorrect import, etc.)
+        print("\n" + "="*70)
+        print(f"❌ CRITICAL ERROR: OpenAI Client Initialization Failed")
+        print(f"Error Type: {type(e).__name__}")
+        print(f"Error Detail: {e}")
+        print("="*70 + "\n")
+        return None
+
+# --- Shared HTTP Sessions ---
+# Headers help prevent a basic 403 Forbidden error on some sites
+SCRAPE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+# One keep-alive pool per host, reused across /extract calls
+HTTP_POOL = SessionPool(headers=SCRAPE_HEADERS)
+# Extracted text keyed by normalized URL (memory LRU, plus disk if SCRAPE_CACHE_DIR is set)
+SCRAPE_CACHE = build_default_cache()
+# Parse while downloading and stop early once callers have enough text (SCRAPE_STREAMING=0 to disable)
+STREAMING_PARSE = os.getenv("SCRAPE_STREAMING", "1") != "0"
+# Where full-page parses run (PARSE_EXECUTOR=inline|thread|process, see parse_pool.py)
+PARSE_EXECUTOR = ParseExecutor()
 
-app = Flask(__name__)
+# --- AI Extraction Settings ---
+AI_MODEL = "gpt-3.5-turbo-0125"
+SYSTEM_PROMPT = (
+    "You are an expert data extraction API. Your task is to process the following text "
+    "and strictly extract the information based on the user's instruction. "
+    "You MUST return the output as a single, valid JSON object, and NOTHING else. "
+    "Do not include any introductory or concluding text."
+)
+# Repeated lines and per-host boilerplate are dropped from scraped text before the prompt
+COMPACTOR = Compactor()
+# Text read from a page for the default 'first' strategy; covers one CHUNK_TOKENS chunk,
+# plus headroom for what compaction removes
+MAX_AI_CHARS = 4000 * (COMPACT_READ_FACTOR if COMPACTOR.enabled else 1)
+# Memoized results keyed by (model, prompt inputs), persisted in SQLite
+AI_CACHE = ResultCache()
+# In-memory SimHash index: near-identical text + same instruction reuses a result (opt-in, NEAR_DUP_THRESHOLD)
+NEAR_DUP = NearDupIndex()
 
 # --- Core Functions ---
 
-def scrape_url(url):
-    """Fetches a URL and extracts clean text content."""
+def scrape_url(url, max_chars=None, links=None, metadata=None):
+    """Fetches a URL and extracts clean text content.
+
+    When max_chars is given and streaming is enabled, the body is parsed while it
+    downloads and reading stops once that much text has been collected.
+    If a links list is passed, the page's outgoing (url, anchor text) pairs are
+    appended to it; that needs the whole page, so streaming is skipped.
+    If a metadata dict is passed, it is filled with the page's structured
+    metadata (see structured.py), read from the same bytes as the text.
+    """
     try:
-        # Headers help prevent a basic 403 Forbidden error on some sites
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status() # Raise exception for bad status codes (4xx or 5xx)
+        cache_key = normalize_url(url)
+    except ValueError as e:
+        return invalid_url_error(e)
+    cached = SCRAPE_CACHE.lookup(cache_key)
+    if cached and not SCRAPE_CACHE.covers(cached, max_chars, need_links=links is not None,
+                                          need_metadata=metadata is not None):
+        # A cut-off (or link/metadata-less) entry is not enough for this caller; fetch the page again
+        cached = None
+    if cached and SCRAPE_CACHE.is_fresh(cached):
+        SCRAPE_CACHE.record("hits")
+        CACHE_EVENTS.inc(cache="scrape", result="hit")
+        if links is not None:
+            links.extend(cached["links"])
+        if metadata is not None:
+            metadata.update(cached["metadata"])
+        return cached["text"]
+    SCRAPE_CACHE.record("misses")
+
+    import requests  # deferred for cold start; a dict lookup after the first call
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+    try:
+        # Expired entries are revalidated; a 304 skips both download and parse
+        headers = conditional_headers(cached) if cached else {}
+        with stage("fetch"):
+            response = HTTP_POOL.get(url, headers=headers, timeout=15, stream=True)
+        if response.status_code == 304 and cached:
+            response.content  # drain the empty body so the connection returns to the pool
+            SCRAPE_CACHE.refresh(cache_key, cached, response.headers)
+            CACHE_EVENTS.inc(cache="scrape", result="revalidated")
+            if links is not None:
+                links.extend(cached["links"])
+            if metadata is not None:
+                metadata.update(cached["metadata"])
+            return cached["text"]
+        CACHE_EVENTS.inc(cache="scrape", result="miss")
 
-        # Remove elements not useful for AI text extraction
-        for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside']):
-            tag.decompose()
+        response.raise_for_status() # Raise exception for bad status codes (4xx or 5xx)
 
-        text_content = soup.get_text(separator='\n', strip=True)
+        # Bodies are read incrementally and never past SCRAPE_MAX_BYTES
+        page_links = page_metadata = None
+        stats = {}
+        is_html = "html" in response.headers.get("Content-Type", "text/html").lower()
+        # Incremental parsing runs on this thread, so it is skipped when parses are offloaded
+        if STREAMING_PARSE and max_chars and links is None and PARSE_EXECUTOR.mode == "inline":
+            raw = [] if metadata is not None else None
+            with stage("download_parse"):
+                text_content, partial = stream_text(response, max_chars=max_chars, stats=stats, raw=raw)
+            BYTES_DOWNLOADED.inc(stats.get("bytes", 0))
+            if metadata is not None:
+                # <head> comes first, so the bytes read before stopping hold it
+                with stage("metadata"):
+                    page_metadata = extract_metadata(b"".join(raw)) if is_html else {}
+        else:
+            with stage("download"):
+                body = read_capped(response, stats=stats)
+            BYTES_DOWNLOADED.inc(len(body))
+            with stage("parse"):
+                base_url = response.url if links is not None and is_html else None
+                text_content, page_links = PARSE_EXECUTOR.parse(body, base_url)
+                partial = False
+                if links is not None:
+                    page_links = page_links or []
+                    links.extend(page_links)
+            if metadata is not None:
+                with stage("metadata"):
+                    page_metadata = extract_metadata(body) if is_html else {}
+        if page_metadata is not None:
+            metadata.update(page_metadata)
+        CHARS_EXTRACTED.inc(len(text_content))
+        if stats.get("truncated"):
+            # Only a prefix of the page was read: cache it as one, so callers wanting more fetch again
+            TRUNCATED_PAGES.inc()
+            partial = True
+        if is_cacheable(response):
+            SCRAPE_CACHE.store(cache_key, text_content, response.headers, partial=partial, links=page_links,
+                               metadata=page_metadata)
         return text_content
     
     except requests.exceptions.HTTPError as e:
+        e.response.close()
+        ERRORS.inc(stage="scrape", error=f"HTTP {e.response.status_code}")
         # Specifically catch 4xx or 5xx errors during the HTTP GET request
         return f"Error Scraping: HTTP Error {e.response.status_code} for URL. (Did you try a login page?)"
     except requests.RequestException as e:
+        ERRORS.inc(stage="scrape", error=type(e).__name__)
         # Catch other request errors like connection timeouts
         return f"Error Scraping: Connection or request issue: {e}"
+    except TimeoutError:
+        ERRORS.inc(stage="scrape", error="ParseTimeout")
+        return f"Error Scraping: Parsing the page took longer than {PARSE_EXECUTOR.timeout:g}s."
 
-def extract_with_ai(text_content, instruction):
-    """Uses the OpenAI Chat API to intelligently extract data."""
-    if not client:
-        # This handles the case where client setup failed at the start
-        return {"error": "AI client not initialized. Check terminal for configuration errors."}
+def invalid_url_error(e):
+    """Error string for a URL whose host or port cannot be parsed ("http://[::1", "http://host:99999")."""
+    ERRORS.inc(stage="scrape", error="InvalidURL")
+    return f"Error Scraping: Connection or request issue: {e}"
+
+def compact_text(text_content, url, info=None):
+    """Scraped text with repeats and the host's boilerplate removed (see compaction.py).
+
+    "Error..." strings pass through. If an info dict is passed, it is filled
+    with the dropped line counts.
+    """
+    if not COMPACTOR.enabled or text_content.startswith("Error"):
+        return text_content
+    with stage("compact"):
+        compacted, stats = COMPACTOR.compact(text_content, url)
+    COMPACTION_LINES.inc(stats["duplicates"], reason="duplicate")
+    COMPACTION_LINES.inc(stats["boilerplate"], reason="boilerplate")
+    if info is not None:
+        info.update(stats)
+    return compacted
+
+def record_sent_tokens(tokens_in, tokens_out, info=None):
+    """Counts tokens a request would have sent without compaction (in) and sends with it (out)."""
+    COMPACTOR.record_tokens(tokens_in, tokens_out)
+    COMPACTION_TOKENS.inc(tokens_in, stage="in")
+    COMPACTION_TOKENS.inc(tokens_out, stage="out")
+    if info is not None:
+        info.update(tokens_in=tokens_in, tokens_out=tokens_out, tokens_saved=tokens_in - tokens_out)
+
+def page_cache_key(instruction, text_content, scope="first"):
+    """Result cache key for a page's answer, from its text as scraped (before compaction).
+
+    Compaction of one page changes as its host's boilerplate is learned, so a
+    key built from the prompt would miss on repeat requests.
+    """
+    return make_key(AI_MODEL, SYSTEM_PROMPT, f"Page result ({scope}): {instruction}\n\n{text_content}")
 
-    system_prompt = (
-        "You are an expert data extraction API. Your task is to process the following text "
-        "and strictly extract the information based on the user's instruction. "
-        "You MUST return the output as a single, valid JSON object, and NOTHING else. "
-        "Do not include any introductory or concluding text."
+def prompt_chunk(text_content, url, info=None):
+    """The chunk the 'first' strategy sends: the leading CHUNK_TOKENS of the compacted text.
+
+    Tokens are counted on it against the first chunk of the scraped text,
+    i.e. what would have been sent without compaction.
+    """
+    chunk = first_chunk(compact_text(text_content, url, info))
+    if COMPACTOR.enabled:
+        record_sent_tokens(count_tokens(first_chunk(text_content)), count_tokens(chunk), info)
+    return chunk
+
+def extract_first_chunk(text_content, url, instruction, cache_mode="prefer", compaction=None):
+    """'first' strategy on scraped text: (result, served_from_cache), cached under the page's key.
+
+    If a compaction dict is passed, it is filled as in compact_text(), plus
+    the tokens sent (see prompt_chunk()).
+    """
+    # The same MAX_AI_CHARS prefix whether the text was streamed or came from a full-page fetch
+    cache_key = page_cache_key(instruction, text_content[:MAX_AI_CHARS])
+    return extract_with_ai_cached(prompt_chunk(text_content, url, compaction), instruction, cache_mode, cache_key)
+
+def extract_all_chunks(text_content, url, instruction, cache_mode="prefer", top_k=None, compaction=None):
+    """'map_reduce' strategy on scraped text: (merged result, chunk info, served_from_cache).
+
+    Chunk results are cached per chunk, and the merged result under the
+    page's key, which a repeat request finds however the page now compacts.
+    """
+    cache_key = page_cache_key(instruction, text_content, f"map_reduce top_k={top_k}")
+    if cache_mode != "bypass":
+        cached = AI_CACHE.get(cache_key)
+        if cached is not None:
+            CACHE_EVENTS.inc(cache="ai", result="hit")
+            return cached["data"], cached["chunks"], True
+
+    compacted = compact_text(text_content, url, compaction)
+    result, chunk_info = map_reduce_extract(
+        compacted, instruction,
+        lambda chunk, instr: extract_with_ai_cached(chunk, instr, cache_mode),
+        top_k=top_k,
     )
+    from_cache = chunk_info.pop("cached")
+    if COMPACTOR.enabled:
+        record_sent_tokens(planned_tokens(text_content, instruction, top_k=top_k), chunk_info["tokens_sent"],
+                           compaction)
+    # A merge that reused near-duplicate pages' answers is not this page's own result
+    if "error" not in result and not chunk_info["near_dup_chunks"]:
+        AI_CACHE.put(cache_key, AI_MODEL, {"data": result, "chunks": chunk_info})
+    return result, chunk_info, from_cache
+
+def extract_with_ai(text_content, instruction, cache_mode="prefer"):
+    """Uses the OpenAI Chat API to intelligently extract data."""
+    result, _ = extract_with_ai_cached(text_content, instruction, cache_mode)
+    return result
+
+def extract_with_ai_cached(text_content, instruction, cache_mode="prefer", cache_key=None):
+    """Same as extract_with_ai, but returns (result, served_from_cache).
 
+    served_from_cache is True for an exact result-cache hit, "near_dup" when
+    another, near-identical page's result was reused (see near_dup.py), else False.
+    cache_mode: 'prefer' answers from the result cache (or a near-duplicate
+    page's result) when possible, 'bypass' always calls the model (and
+    refreshes the cache), 'only' never calls it. cache_key replaces the key
+    built from the prompt (see page_cache_key()).
+    """
     user_prompt = f"Extraction Instruction: {instruction}\n\n--- Content to process ---\n\n{text_content}"
+    cache_key = cache_key or make_key(AI_MODEL, SYSTEM_PROMPT, user_prompt)
+    instruction_key = make_key(AI_MODEL, SYSTEM_PROMPT, instruction)
+
+    if cache_mode != "bypass":
+        cached = AI_CACHE.get(cache_key)
+        CACHE_EVENTS.inc(cache="ai", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached, True
+        similar = NEAR_DUP.lookup(instruction_key, text_content)
+        CACHE_EVENTS.inc(cache="near_dup", result="hit" if similar is not None else "miss")
+        if similar is not None:
+            return similar, "near_dup"
+        if cache_mode == "only":
+            return {"error": "No cached AI result for this content and instruction (cache=only)."}, False
+
+    result = complete_json(user_prompt)
+    if "error" not in result:
+        AI_CACHE.put(cache_key, AI_MODEL, result)
+        NEAR_DUP.add(instruction_key, text_content, result)
+    return result, False
+
+def complete_json(user_prompt):
+    """Sends one chat completion and parses the JSON object it returns."""
+    client = get_client()
+    if not client:
+        ERRORS.inc(stage="ai", error="ClientNotInitialized")
+        # This handles the case where client setup failed at the start
+        return {"error": "AI client not initialized. Check terminal for configuration errors."}
 
     try:
-        completion = client.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
+        with stage("ai"):
+            completion = client.chat.completions.create(
+                model=AI_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt}
+                ],
+                response_format={"type": "json_object"}
+            )
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            TOKENS.inc(usage.prompt_tokens or 0, direction="sent")
+            TOKENS.inc(usage.completion_tokens or 0, direction="received")
 
         ai_response_text = completion.choices[0].message.content
         return json.loads(ai_response_text)
         
     except json.JSONDecodeError:
+        ERRORS.inc(stage="ai", error="JSONDecodeError")
         # Catches if the AI returns malformed JSON
         return {"error": "AI returned malformed JSON. Try simplifying your instruction."}
     except Exception as e:
+        ERRORS.inc(stage="ai", error=type(e).__name__)
         # Catches general AI errors, most likely AuthenticationError, InvalidRequestError, or RateLimitError
         return {"error": f"AI extraction failed (OpenAI API Error): {type(e).__name__} - {e}"}
 
-# --- Flask Routes ---
-
-@app.route('/')
-def index():
-    return render_template('index.html')
+def structured_answer(metadata, wanted, mode):
+    """(body, status) when page metadata settles the request, else None to go on to the model.
 
-@app.route('/extract', methods=['POST'])
-def extract_data():
-    """API endpoint to receive URL and instruction, then run scraping and AI extraction."""
-    data = request.json
-    url = data.get('url')
-    instruction = data.get('instruction')
+    wanted comes from requested_fields(). mode 'auto' answers only if every
+    wanted field was found; 'structured' never falls through, so missing
+    fields are a 422.
+    """
+    with stage("structured"):
+        found, missing = answer_from_metadata(metadata, wanted) if wanted and metadata else ({}, wanted)
+    if wanted and not missing:
+        EXTRACT_SOURCES.inc(source="structured")
+        return {"data": found, "cached": False, "source": "structured"}, 200
+    if mode != "structured":
+        return None
+    EXTRACT_SOURCES.inc(source="structured_incomplete")
+    if not wanted:
+        reason = "no field names found; quote the keys in the instruction or pass 'fields'"
+    else:
+        reason = f"not in the page's metadata: {', '.join(missing)}"
+    return {"error": f"Structured extraction incomplete ({reason}).", "data": found, "missing": missing,
+            "source": "structured"}, 422
 
-    if not url or not instruction:
-        return jsonify({"error": "Missing URL or instruction"}), 400
+def run_extraction(url, instruction, cache_mode="prefer", strategy="first", top_k=None,
+                   mode=EXTRACT_MODE, fields=None):
+    """Scrape + AI extraction for one URL; returns (response body, http status).
 
-    # 1. Scrape the raw content
-    raw_content = scrape_url(url)
+    strategy 'first' sends only the leading token-bounded chunk; 'map_reduce'
+    extracts from every chunk (or the top_k most relevant) and merges the results.
+    mode 'auto' first tries the page's structured metadata (JSON-LD, OpenGraph,
+    microdata, <title>/<meta>) when explicit fields are given, and skips the
+    model if it has every one; 'llm' always uses the model, 'structured' never does.
+    Text bound for the model is compacted first; the body's "compaction"
+    field reports the lines dropped, and the tokens sent against what the same
+    strategy would have sent without compaction.
+    """
+    # 1. Scrape the raw content (map_reduce needs the whole page); metadata is
+    # only parsed when the structured path has fields to fill
+    wanted = requested_fields(instruction, fields, mode)
+    metadata = {} if wanted else None
+    with stage("scrape"):
+        raw_content = scrape_url(url, max_chars=None if strategy == "map_reduce" else MAX_AI_CHARS,
+                                 metadata=metadata)
     if raw_content.startswith("Error"):
         # Returns the specific scraping error message
-        return jsonify({"error": raw_content}), 500
+        return {"error": raw_content}, 500
+
+    # 2. Answer from structured metadata when it covers every requested field
+    if mode != "llm":
+        answered = structured_answer(metadata, wanted, mode)
+        if answered is not None:
+            return answered
 
-    # 2. Extract structured data using AI (using first 4000 chars to save tokens)
-    truncated_content = raw_content[:4000]
-    extracted_data = extract_with_ai(truncated_content, instruction)
+    # 3. Extract structured data using AI, from text with repeated lines and site
+    # boilerplate dropped; results are cached under the page as scraped
+    compaction = {}
+    chunk_info = None
+    with stage("extract"):
+        if strategy == "map_reduce":
+            extracted_data, chunk_info, from_cache = extract_all_chunks(raw_content, url, instruction, cache_mode,
+                                                                        top_k, compaction)
+        else:
+            # First chunk only (cut on a line boundary within the token budget) to save tokens
+            extracted_data, from_cache = extract_first_chunk(raw_content, url, instruction, cache_mode, compaction)
 
-    # 3. Handle and return results
+    # 4. Handle and return results
     if "error" in extracted_data:
+        # cache=only with nothing cached is a lookup miss, not a server failure
+        status = 404 if cache_mode == "only" else 500
         # Returns the specific AI extraction error message
-        return jsonify(extracted_data), 500
-    
-    return jsonify({"data": extracted_data})
-# ADD THIS TO THE BOTTOM OF app.py
+        return extracted_data, status
+
+    # A near-duplicate page's answer is not this page's; say so instead of "cached"
+    source = "near_dup" if from_cache == "near_dup" else "llm"
+    EXTRACT_SOURCES.inc(source=source)
+    body = {"data": extracted_data, "cached": from_cache is True, "source": source}
+    if chunk_info is not None:
+        body["chunks"] = chunk_info
+    if compaction:
+        body["compaction"] = compaction
+    return body, 200
+
+def parse_extract_request(data):
+    """Validates an /extract-style body; returns (kwargs for run_extraction, error)."""
+    data = data or {}
+    url = data.get('url')
+    instruction = data.get('instruction')
+    cache_mode = data.get('cache', 'prefer')
+    strategy = data.get('strategy', 'first')
+    top_k = data.get('top_k')
+    mode = data.get('mode', EXTRACT_MODE)
+    fields = data.get('fields')
+
+    if not url or not instruction:
+        return None, "Missing URL or instruction"
+    if cache_mode not in CACHE_MODES:
+        return None, f"Invalid cache option '{cache_mode}'. Use one of: {', '.join(CACHE_MODES)}"
+    if strategy not in STRATEGIES:
+        return None, f"Invalid strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}"
+    if top_k is not None and (not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1):
+        return None, "top_k must be a positive integer"
+    if mode not in EXTRACT_MODES:
+        return None, f"Invalid mode '{mode}'. Use one of: {', '.join(EXTRACT_MODES)}"
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) and f for f in fields)):
+        return None, "fields must be a list of field names"
+    return {"url": url, "instruction": instruction, "cache_mode": cache_mode,
+            "strategy": strategy, "top_k": top_k, "mode": mode, "fields": fields}, None
+
+# Background workers for POST /jobs
+JOB_QUEUE = JobQueue(run_extraction)
+
+# Shared fetch/AI worker pools for /extract_batch
+BATCH_RUNNER = BatchRunner(lambda url: scrape_url(url, max_chars=MAX_AI_CHARS))
+
+def fetch_robots(url):
+    # Read like a page body, but never past ROBOTS_MAX_BYTES; robots.txt is UTF-8 (RFC 9309)
+    response = HTTP_POOL.get(url, timeout=10, stream=True)
+    return response.status_code, read_capped(response, ROBOTS_MAX_BYTES).decode("utf-8", "replace")
+
+# Site crawls for /crawl: robots.txt is cached per host across crawls
+CRAWLER = Crawler(lambda url, links=None: scrape_url(url, links=links),
+                  robots=RobotsCache(fetch_robots), rate_limiter=RateLimiter())
+
+def parse_crawl_request(data):
+    """Validates a /crawl body; returns (kwargs for CRAWLER.crawl minus extract_fn, cache mode, error)."""
+    data = data or {}
+    url = data.get('url')
+    instruction = data.get('instruction')
+    cache_mode = data.get('cache', 'prefer')
+    max_pages = data.get('max_pages', CRAWL_MAX_PAGES)
+    max_depth = data.get('max_depth', CRAWL_MAX_DEPTH)
+    domains = data.get('domains')
+
+    if not url or not instruction:
+        return None, None, "Missing URL or instruction"
+    try:
+        normalize_url(url)
+    except ValueError as e:
+        # The crawler splits the seed before fetching anything
+        return None, None, f"Invalid URL: {e}"
+    if cache_mode not in CACHE_MODES:
+        return None, None, f"Invalid cache option '{cache_mode}'. Use one of: {', '.join(CACHE_MODES)}"
+    if not isinstance(max_pages, int) or isinstance(max_pages, bool) or not 1 <= max_pages <= CRAWL_PAGE_LIMIT:
+        return None, None, f"max_pages must be an integer between 1 and {CRAWL_PAGE_LIMIT}"
+    if not isinstance(max_depth, int) or isinstance(max_depth, bool) or not 0 <= max_depth <= CRAWL_DEPTH_LIMIT:
+        return None, None, f"max_depth must be an integer between 0 and {CRAWL_DEPTH_LIMIT}"
+    if domains is not None and (not isinstance(domains, list) or not all(isinstance(d, str) and d for d in domains)):
+        return None, None, "domains must be a list of host names"
+    return {"seed": url, "instruction": instruction, "max_pages": max_pages,
+            "max_depth": max_depth, "domains": domains}, cache_mode, None
+
+# --- Flask App Factory ---
+
+def create_app():
+    """Builds the Flask app and registers the routes (Flask is imported here, not at module load)."""
+    from flask import Flask, Response, request, jsonify, render_template
+
+    app = Flask(__name__)
+
+    @app.route('/')
+    def index():
+        return render_template('index.html')
+
+    @app.route('/extract', methods=['POST'])
+    def extract_data():
+        """API endpoint to receive URL and instruction, then run scraping and AI extraction."""
+        data = request.json or {}
+        params, error = parse_extract_request(data)
+        if error:
+            REQUESTS.inc(endpoint="extract", status=400)
+            return jsonify({"error": error}), 400
+
+        with track_request() as timings:
+            with stage("request"):
+                body, status = run_extraction(**params)
+        REQUESTS.inc(endpoint="extract", status=status)
+
+        # Optional per-stage breakdown in milliseconds
+        if data.get('timings'):
+            body["timings"] = timings
+        return jsonify(body), status
+
+    @app.route('/jobs', methods=['POST'])
+    def submit_job():
+        """Queues an extraction and returns its job id immediately (429 when the queue is full)."""
+        params, error = parse_extract_request(request.json)
+        if error:
+            return jsonify({"error": error}), 400
+
+        try:
+            job_id = JOB_QUEUE.submit(params)
+        except QueueFull as e:
+            return jsonify({"error": str(e)}), 429, {"Retry-After": "5"}
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+    @app.route('/jobs/<job_id>')
+    def get_job(job_id):
+        """Status of a queued extraction, plus its result once finished."""
+        job = JOB_QUEUE.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown or expired job id"}), 404
+        return jsonify(job)
+
+    @app.route('/extract_batch', methods=['POST'])
+    def extract_batch():
+        """Runs many {url, instruction} jobs concurrently and streams results as NDJSON."""
+        data = request.json or {}
+        jobs = data.get('jobs')
+        cache_mode = data.get('cache', 'prefer')
+
+        error = validate_jobs(jobs)
+        if error:
+            return jsonify({"error": error}), 400
+        if cache_mode not in CACHE_MODES:
+            return jsonify({"error": f"Invalid cache option '{cache_mode}'. Use one of: {', '.join(CACHE_MODES)}"}), 400
+
+        def extract(text, instruction, url):
+            return extract_first_chunk(text, url, instruction, cache_mode)
+
+        def stream():
+            for item in BATCH_RUNNER.run(jobs, extract):
+                yield json.dumps(item) + "\n"
+
+        return Response(stream(), mimetype='application/x-ndjson')
+
+    @app.route('/crawl', methods=['POST'])
+    def crawl():
+        """Crawls a site from a seed URL and streams one NDJSON result per page, then a summary."""
+        params, cache_mode, error = parse_crawl_request(request.json)
+        if error:
+            return jsonify({"error": error}), 400
+
+        def extract(text, instruction, url):
+            return extract_first_chunk(text, url, instruction, cache_mode)
+
+        def stream():
+            for item in CRAWLER.crawl(extract_fn=extract, **params):
+                yield json.dumps(item) + "\n"
+
+        return Response(stream(), mimetype='application/x-ndjson')
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Stage latency histograms and pipeline counters in Prometheus text format."""
+        return Response(render_metrics(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+    @app.route('/stats/pool')
+    def pool_stats():
+        """Connection pool hit/miss and reuse counters for the scraper sessions."""
+        return jsonify(HTTP_POOL.stats())
+
+    @app.route('/stats/parse')
+    def parse_stats():
+        """Parse executor mode and how many pages were parsed inline vs offloaded."""
+        return jsonify(PARSE_EXECUTOR.stats())
+
+    @app.route('/stats/cache')
+    def cache_stats():
+        """Scrape cache, AI result cache, near-duplicate index and compaction counters."""
+        return jsonify({"scrape": SCRAPE_CACHE.stats(), "ai": AI_CACHE.stats(), "near_dup": NEAR_DUP.stats(),
+                        "compaction": COMPACTOR.stats()})
+
+    @app.route('/stats/jobs')
+    def job_stats():
+        """Job queue depth, wait-time and outcome counters."""
+        return jsonify(JOB_QUEUE.stats())
+
+    return app
 
 def test_extraction():
     # Use a URL you know is simple and public
@@ -144,7 +653,7 @@ def test_extraction():
     scraped_text = scrape_url(test_url)
     if scraped_text.startswith("Error"):
         print(f"Scraping failed: {scraped_text}")
-        return
+        return False
 
     print(f"Scraping succeeded. Content size: {len(scraped_text)} characters.")
 
@@ -154,14 +663,111 @@ def test_extraction():
     print("\n--- AI RESULT ---")
     if "error" in ai_result:
         print(f"AI Extraction Failed: {ai_result['error']}")
-    else:
-        print("AI Extraction SUCCESS! Result:")
-        print(json.dumps(ai_result, indent=2))
+        return False
+    print("AI Extraction SUCCESS! Result:")
+    print(json.dumps(ai_result, indent=2))
 
     print("--- TEST ENDED ---\n")
+    return True
+
+# --- Self-Test ---
+
+# Cold-start budget for `import app` (cumulative import time, milliseconds)
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "150"))
+# Must not be imported until first use
+DEFERRED_MODULES = ("openai", "requests", "bs4", "flask", "sqlite3")
+
+def profile_import():
+    """Imports app in a fresh interpreter with -X importtime; returns (ms, heavy modules loaded)."""
+    import subprocess
+
+    code = ("import json, sys, app; "
+            f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))")
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=here, capture_output=True, text=True, timeout=60)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+
+    # Lines look like "import time:   self |  cumulative | name"; the top-level app line is the total
+    total_us = None
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == "app":
+            total_us = int(parts[1])
+    loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+    return (total_us or 0) / 1000.0, loaded
+
+def selftest(live=False):
+    """Offline startup and wiring checks; with live=True also runs test_extraction(). Returns True on success."""
+    ok = True
+
+    import_ms, loaded = profile_import()
+    if import_ms > STARTUP_BUDGET_MS:
+        print(f"❌ import app took {import_ms:.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)")
+        ok = False
+    else:
+        print(f"✅ import app took {import_ms:.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)")
+    if loaded:
+        print(f"❌ Imported eagerly: {', '.join(loaded)}")
+        ok = False
+    else:
+        print(f"✅ Deferred until first use: {', '.join(DEFERRED_MODULES)}")
+
+    from parsers import check_parity, selected_backend
+    backend = selected_backend()
+    failures = check_parity(backend)
+    if failures:
+        print(f"❌ Parser backend '{backend}' mismatches fixtures: {', '.join(failures)}")
+        ok = False
+    else:
+        print(f"✅ Parser backend '{backend}' matches the fixtures")
+
+    with create_app().test_client() as http:
+        statuses = {path: http.get(path).status_code for path in ('/', '/metrics', '/stats/cache', '/stats/jobs')}
+        bad = http.post('/extract', json={}).status_code
+        # Rejected before any network access, as a JSON scrape error rather than a crash
+        malformed = http.post('/extract', json={"url": "http://[::1", "instruction": "title"})
+    malformed_ok = (malformed.status_code == 500 and malformed.is_json
+                    and malformed.get_json().get("error", "").startswith("Error Scraping"))
+    if any(status != 200 for status in statuses.values()) or bad != 400 or not malformed_ok:
+        print(f"❌ Routes: {statuses}, empty /extract -> {bad}, malformed URL -> {malformed.status_code}")
+        ok = False
+    else:
+        print(f"✅ Routes respond ({len(statuses) + 2} checked)")
+
+    from bulk import check_retry_errors
+    failure = check_retry_errors()
+    if failure:
+        print(f"❌ bulk --retry-errors: {failure}")
+        ok = False
+    else:
+        print("✅ bulk --retry-errors keeps one row per id")
+
+    if live:
+        ok = test_extraction() and ok
+    return ok
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AI scraper API")
+    commands = parser.add_subparsers(dest="command")
+    serve = commands.add_parser("serve", help="Run the Flask server (default)")
+    serve.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    serve.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    serve.add_argument("--debug", action="store_true")
+    check = commands.add_parser("selftest", help="Offline startup budget and wiring checks")
+    check.add_argument("--live", action="store_true", help="Also scrape and extract a real page (needs network + API key)")
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        args = parser.parse_args(["serve"])
+    if args.command == "selftest":
+        return 0 if selftest(live=args.live) else 1
+
+    create_app().run(host=args.host, port=args.port, debug=args.debug)
+    return 0
 
-# Change the if __name__ == '__main__': block temporarily
 if __name__ == '__main__':
-    # Comment out the Flask run line and call the test function
-    test_extraction()
-    # app.run(debug=True)
+    sys.exit(main())
@@ -0,0 +1,536 @@
+"""Async (ASGI) serving mode for the scraper API.
+
+Same routes and JSON contract as the Flask app in app.py, but every /extract
+runs as a task on one event loop: pages are fetched with httpx.AsyncClient and
+the model is called through openai.AsyncOpenAI, so a waiting request costs a
+coroutine instead of an OS thread. Caches, metrics, the job queue and request
+validation are shared with app.py, whose synchronous scrape_url and
+extract_with_ai keep working unchanged. /crawl runs on app.py's threaded
+crawler (per-host politeness and robots cache are process-wide there) and
+is streamed from Starlette's thread pool.
+
+Run with:  python asgi_app.py   (or: uvicorn asgi_app:app --port 8000)
+"""
+
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from http.cookiejar import DefaultCookiePolicy
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import app as core
+from ai_cache import CACHE_MODES, make_key
+from batch import BATCH_AI_WORKERS, BATCH_PER_HOST, RateLimiter, validate_jobs
+from chunking import map_reduce_extract_async, planned_tokens
+from http_pool import POOL_MAX_HOSTS, POOL_MAXSIZE, RETRY_TOTAL, host_key
+from jobs import QueueFull
+from metrics import (BYTES_DOWNLOADED, CACHE_EVENTS, CHARS_EXTRACTED, ERRORS, EXTRACT_SOURCES, REQUESTS, TOKENS,
+                     TRUNCATED_PAGES, CONTENT_TYPE as METRICS_CONTENT_TYPE, render as render_metrics, stage,
+                     track_request)
+from parsers import html_to_text
+from scrape_cache import conditional_headers, is_cacheable, normalize_url
+from streaming_parse import CHUNK_SIZE, MAX_DOWNLOAD_BYTES, TextStream
+from structured import EXTRACT_MODE, extract_metadata
+
+# --- Async Client Configuration (override via environment) ---
+# Total open connections across all hosts; per-host fairness comes from the batch semaphores
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", str(POOL_MAX_HOSTS)))
+ASYNC_MAX_KEEPALIVE = int(os.getenv("ASYNC_MAX_KEEPALIVE", str(POOL_MAXSIZE * 10)))
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+# Created inside the running loop (see lifespan / http_client)
+HTTP_CLIENT = None
+aclient = None
+
+# --- Clients ---
+
+def http_client():
+    """The shared httpx.AsyncClient (keep-alive pool, connect retries, redirects followed like requests).
+
+    Like http_pool's sessions it keeps no cookies, so no Set-Cookie reaches another caller's fetch.
+    """
+    global HTTP_CLIENT
+    if HTTP_CLIENT is None:
+        HTTP_CLIENT = httpx.AsyncClient(
+            headers=core.SCRAPE_HEADERS,
+            timeout=15,
+            follow_redirects=True,
+            transport=httpx.AsyncHTTPTransport(
+                retries=RETRY_TOTAL,
+                limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS,
+                                    max_keepalive_connections=ASYNC_MAX_KEEPALIVE),
+            ),
+        )
+        HTTP_CLIENT.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return HTTP_CLIENT
+
+
+def ai_client():
+    """The AsyncOpenAI client, or None when app.py could not configure OpenAI."""
+    global aclient
+    if aclient is None and core.get_client() is not None:
+        try:
+            from openai import AsyncOpenAI
+            aclient = AsyncOpenAI()
+        except Exception as e:
+            print(f"❌ Async OpenAI client initialization failed: {type(e).__name__} - {e}")
+    return aclient
+
+# --- Core Functions ---
+
+async def _iter_capped(response, max_bytes=MAX_DOWNLOAD_BYTES, stats=None):
+    read = 0
+    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+        if not chunk:
+            continue
+        remaining = max_bytes - read
+        if len(chunk) > remaining:
+            if stats is not None:
+                stats["truncated"] = True
+            if remaining:
+                yield chunk[:remaining]
+            return
+        read += len(chunk)
+        yield chunk
+
+
+async def scrape_url_async(url, max_chars=None, metadata=None):
+    """scrape_url for the event loop: same cache, validators, byte cap and error strings."""
+    try:
+        cache_key = normalize_url(url)
+    except ValueError as e:
+        return core.invalid_url_error(e)
+    cached = core.SCRAPE_CACHE.lookup(cache_key)
+    if cached and not core.SCRAPE_CACHE.covers(cached, max_chars, need_metadata=metadata is not None):
+        cached = None
+    if cached and core.SCRAPE_CACHE.is_fresh(cached):
+        core.SCRAPE_CACHE.record("hits")
+        CACHE_EVENTS.inc(cache="scrape", result="hit")
+        if metadata is not None:
+            metadata.update(cached["metadata"])
+        return cached["text"]
+    core.SCRAPE_CACHE.record("misses")
+
+    client = http_client()
+    try:
+        headers = conditional_headers(cached) if cached else {}
+        with stage("fetch"):
+            response = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+        try:
+            if response.status_code == 304 and cached:
+                core.SCRAPE_CACHE.refresh(cache_key, cached, response.headers)
+                CACHE_EVENTS.inc(cache="scrape", result="revalidated")
+                if metadata is not None:
+                    metadata.update(cached["metadata"])
+                return cached["text"]
+            CACHE_EVENTS.inc(cache="scrape", result="miss")
+
+            response.raise_for_status()
+
+            raw = []
+            stats = {}
+            if core.STREAMING_PARSE and max_chars and core.PARSE_EXECUTOR.mode == "inline":
+                # Chunks are small, so incremental parsing stays on the loop
+                stream = TextStream(max_chars=max_chars)
+                with stage("download_parse"):
+                    async for chunk in _iter_capped(response, stats=stats):
+                        if metadata is not None:
+                            raw.append(chunk)
+                        if stream.feed(chunk):
+                            break
+                    text_content, partial = stream.finish()
+                BYTES_DOWNLOADED.inc(stream.size)
+            else:
+                with stage("download"):
+                    body = b"".join([chunk async for chunk in _iter_capped(response, stats=stats)])
+                BYTES_DOWNLOADED.inc(len(body))
+                # A full-page parse is CPU-bound; keep it off the event loop
+                with stage("parse"):
+                    if core.PARSE_EXECUTOR.mode == "inline":
+                        text_content = await asyncio.to_thread(html_to_text, body)
+                    else:
+                        text_content, _ = await asyncio.wrap_future(core.PARSE_EXECUTOR.submit(body))
+                    partial = False
+                raw = [body]
+        finally:
+            await response.aclose()
+
+        page_metadata = None
+        if metadata is not None:
+            is_html = "html" in response.headers.get("Content-Type", "text/html").lower()
+            with stage("metadata"):
+                page_metadata = await asyncio.to_thread(extract_metadata, b"".join(raw)) if is_html else {}
+            metadata.update(page_metadata)
+        CHARS_EXTRACTED.inc(len(text_content))
+        if stats.get("truncated"):
+            TRUNCATED_PAGES.inc()
+            partial = True
+        if is_cacheable(response):
+            core.SCRAPE_CACHE.store(cache_key, text_content, response.headers, partial=partial,
+                                    metadata=page_metadata)
+        return text_content
+
+    except httpx.HTTPStatusError as e:
+        ERRORS.inc(stage="scrape", error=f"HTTP {e.response.status_code}")
+        return f"Error Scraping: HTTP Error {e.response.status_code} for URL. (Did you try a login page?)"
+    except httpx.HTTPError as e:
+        ERRORS.inc(stage="scrape", error=type(e).__name__)
+        return f"Error Scraping: Connection or request issue: {e}"
+    except httpx.InvalidURL as e:
+        # Not an HTTPError; raised by build_request for hosts or ports httpx rejects
+        return core.invalid_url_error(e)
+
+
+async def extract_with_ai_cached_async(text_content, instruction, cache_mode="prefer", cache_key=None):
+    """extract_with_ai_cached for the event loop; returns (result, served_from_cache)."""
+    user_prompt = f"Extraction Instruction: {instruction}\n\n--- Content to process ---\n\n{text_content}"
+    cache_key = cache_key or make_key(core.AI_MODEL, core.SYSTEM_PROMPT, user_prompt)
+    instruction_key = make_key(core.AI_MODEL, core.SYSTEM_PROMPT, instruction)
+
+    if cache_mode != "bypass":
+        cached = await asyncio.to_thread(core.AI_CACHE.get, cache_key)
+        CACHE_EVENTS.inc(cache="ai", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached, True
+        # Fingerprinting is CPU work proportional to the text; keep it off the loop
+        similar = await asyncio.to_thread(core.NEAR_DUP.lookup, instruction_key, text_content)
+        CACHE_EVENTS.inc(cache="near_dup", result="hit" if similar is not None else "miss")
+        if similar is not None:
+            return similar, "near_dup"
+        if cache_mode == "only":
+            return {"error": "No cached AI result for this content and instruction (cache=only)."}, False
+
+    result = await complete_json_async(user_prompt)
+    if "error" not in result:
+        await asyncio.to_thread(core.AI_CACHE.put, cache_key, core.AI_MODEL, result)
+        await asyncio.to_thread(core.NEAR_DUP.add, instruction_key, text_content, result)
+    return result, False
+
+
+async def extract_first_chunk_async(text_content, url, instruction, cache_mode="prefer", compaction=None):
+    """extract_first_chunk for the event loop; returns (result, served_from_cache)."""
+    cache_key = core.page_cache_key(instruction, text_content[:core.MAX_AI_CHARS])
+    return await extract_with_ai_cached_async(core.prompt_chunk(text_content, url, compaction), instruction,
+                                              cache_mode, cache_key)
+
+
+async def extract_all_chunks_async(text_content, url, instruction, cache_mode="prefer", top_k=None,
+                                   compaction=None):
+    """extract_all_chunks for the event loop; returns (merged result, chunk info, served_from_cache)."""
+    cache_key = core.page_cache_key(instruction, text_content, f"map_reduce top_k={top_k}")
+    if cache_mode != "bypass":
+        cached = await asyncio.to_thread(core.AI_CACHE.get, cache_key)
+        if cached is not None:
+            CACHE_EVENTS.inc(cache="ai", result="hit")
+            return cached["data"], cached["chunks"], True
+
+    compacted = core.compact_text(text_content, url, compaction)
+    result, chunk_info = await map_reduce_extract_async(
+        compacted, instruction,
+        lambda chunk, instr: extract_with_ai_cached_async(chunk, instr, cache_mode),
+        top_k=top_k,
+    )
+    from_cache = chunk_info.pop("cached")
+    if core.COMPACTOR.enabled:
+        tokens_in = await asyncio.to_thread(planned_tokens, text_content, instruction, top_k=top_k)
+        core.record_sent_tokens(tokens_in, chunk_info["tokens_sent"], compaction)
+    if "error" not in result and not chunk_info["near_dup_chunks"]:
+        await asyncio.to_thread(core.AI_CACHE.put, cache_key, core.AI_MODEL, {"data": result, "chunks": chunk_info})
+    return result, chunk_info, from_cache
+
+
+async def complete_json_async(user_prompt):
+    """Sends one chat completion through AsyncOpenAI and parses the JSON object it returns."""
+    client = ai_client()
+    if not client:
+        ERRORS.inc(stage="ai", error="ClientNotInitialized")
+        return {"error": "AI client not initialized. Check terminal for configuration errors."}
+
+    try:
+        with stage("ai"):
+            completion = await client.chat.completions.create(
+                model=core.AI_MODEL,
+                messages=[
+                    {"role": "system", "content": core.SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt}
+                ],
+                response_format={"type": "json_object"}
+            )
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            TOKENS.inc(usage.prompt_tokens or 0, direction="sent")
+            TOKENS.inc(usage.completion_tokens or 0, direction="received")
+
+        return json.loads(completion.choices[0].message.content)
+
+    except json.JSONDecodeError:
+        ERRORS.inc(stage="ai", error="JSONDecodeError")
+        return {"error": "AI returned malformed JSON. Try simplifying your instruction."}
+    except Exception as e:
+        ERRORS.inc(stage="ai", error=type(e).__name__)
+        return {"error": f"AI extraction failed (OpenAI API Error): {type(e).__name__} - {e}"}
+
+
+async def run_extraction_async(url, instruction, cache_mode="prefer", strategy="first", top_k=None,
+                               mode=EXTRACT_MODE, fields=None):
+    """run_extraction for the event loop; returns (response body, http status)."""
+    wanted = core.requested_fields(instruction, fields, mode)
+    metadata = {} if wanted else None
+    with stage("scrape"):
+        raw_content = await scrape_url_async(url, max_chars=None if strategy == "map_reduce" else core.MAX_AI_CHARS,
+                                             metadata=metadata)
+    if raw_content.startswith("Error"):
+        return {"error": raw_content}, 500
+
+    if mode != "llm":
+        answered = core.structured_answer(metadata, wanted, mode)
+        if answered is not None:
+            return answered
+
+    compaction = {}
+    chunk_info = None
+    with stage("extract"):
+        if strategy == "map_reduce":
+            extracted_data, chunk_info, from_cache = await extract_all_chunks_async(
+                raw_content, url, instruction, cache_mode, top_k, compaction)
+        else:
+            extracted_data, from_cache = await extract_first_chunk_async(
+                raw_content, url, instruction, cache_mode, compaction)
+
+    if "error" in extracted_data:
+        status = 404 if cache_mode == "only" else 500
+        return extracted_data, status
+
+    source = "near_dup" if from_cache == "near_dup" else "llm"
+    EXTRACT_SOURCES.inc(source=source)
+    body = {"data": extracted_data, "cached": from_cache is True, "source": source}
+    if chunk_info is not None:
+        body["chunks"] = chunk_info
+    if compaction:
+        body["compaction"] = compaction
+    return body, 200
+
+# --- Batch Limits ---
+
+# One event loop serves every batch, so these are process-wide like BatchRunner's pools
+_HOST_SEMAPHORES = {}  # host -> [semaphore, jobs holding or waiting for it]
+_AI_SEMAPHORE = None
+BATCH_RATE_LIMITER = RateLimiter()
+
+
+@asynccontextmanager
+async def _host_slot(url):
+    # Same bookkeeping as HostLimiter: idle hosts drop their semaphore
+    key = host_key(url)
+    entry = _HOST_SEMAPHORES.get(key)
+    if entry is None:
+        entry = _HOST_SEMAPHORES[key] = [asyncio.Semaphore(BATCH_PER_HOST), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _HOST_SEMAPHORES[key]
+
+
+def _ai_semaphore():
+    global _AI_SEMAPHORE
+    if _AI_SEMAPHORE is None:
+        _AI_SEMAPHORE = asyncio.Semaphore(BATCH_AI_WORKERS)
+    return _AI_SEMAPHORE
+
+
+async def _run_batch_job(index, job, cache_mode):
+    url = job.get("url") if isinstance(job, dict) else None
+    instruction = job.get("instruction") if isinstance(job, dict) else None
+    if not url or not instruction:
+        return {"index": index, "url": url, "error": "Missing URL or instruction"}
+
+    started = asyncio.get_running_loop().time()
+    try:
+        async with _host_slot(url):
+            text = await scrape_url_async(url, max_chars=core.MAX_AI_CHARS)
+    except Exception as e:
+        text = f"Error Scraping: {type(e).__name__} - {e}"
+    if text.startswith("Error"):
+        return {"index": index, "url": url, "error": text,
+                "elapsed": round(asyncio.get_running_loop().time() - started, 3)}
+
+    try:
+        async with _ai_semaphore():
+            await BATCH_RATE_LIMITER.acquire_async()
+            data, from_cache = await extract_first_chunk_async(text, url, instruction, cache_mode)
+    except Exception as e:
+        data, from_cache = {"error": f"AI extraction failed: {type(e).__name__} - {e}"}, False
+
+    item = {"index": index, "url": url, "elapsed": round(asyncio.get_running_loop().time() - started, 3)}
+    if "error" in data:
+        item["error"] = data["error"]
+    else:
+        item["data"] = data
+        item["cached"] = from_cache is True
+        if from_cache == "near_dup":
+            item["near_dup"] = True
+    return item
+
+# --- Routes ---
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def index(request):
+    return FileResponse(TEMPLATE_PATH)
+
+
+async def extract_data(request):
+    """Async /extract: same body, response and status codes as the Flask route."""
+    data = await _json_body(request) or {}
+    params, error = core.parse_extract_request(data)
+    if error:
+        REQUESTS.inc(endpoint="extract", status=400)
+        return JSONResponse({"error": error}, status_code=400)
+
+    with track_request() as timings:
+        with stage("request"):
+            body, status = await run_extraction_async(**params)
+    REQUESTS.inc(endpoint="extract", status=status)
+
+    if data.get('timings'):
+        body["timings"] = timings
+    return JSONResponse(body, status_code=status)
+
+
+async def submit_job(request):
+    """Queues an extraction on app.py's job workers (429 when the queue is full)."""
+    params, error = core.parse_extract_request(await _json_body(request))
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    try:
+        job_id = core.JOB_QUEUE.submit(params)
+    except QueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": "5"})
+    return JSONResponse({"job_id": job_id, "status": "queued"}, status_code=202)
+
+
+async def get_job(request):
+    job = core.JOB_QUEUE.get(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "Unknown or expired job id"}, status_code=404)
+    return JSONResponse(job)
+
+
+async def extract_batch(request):
+    """Runs every job as a task and streams results as NDJSON in completion order."""
+    data = await _json_body(request) or {}
+    jobs = data.get('jobs')
+    cache_mode = data.get('cache', 'prefer')
+
+    error = validate_jobs(jobs)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+    if cache_mode not in CACHE_MODES:
+        return JSONResponse({"error": f"Invalid cache option '{cache_mode}'. Use one of: {', '.join(CACHE_MODES)}"},
+                            status_code=400)
+
+    async def stream():
+        tasks = [asyncio.create_task(_run_batch_job(index, job, cache_mode)) for index, job in enumerate(jobs)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client went away mid-stream: stop whatever is still running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type='application/x-ndjson')
+
+
+async def crawl(request):
+    """Crawls a site from a seed URL and streams one NDJSON result per page, then a summary."""
+    params, cache_mode, error = core.parse_crawl_request(await _json_body(request))
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    def extract(text, instruction, url):
+        return core.extract_first_chunk(text, url, instruction, cache_mode)
+
+    def stream():
+        for item in core.CRAWLER.crawl(extract_fn=extract, **params):
+            yield json.dumps(item) + "\n"
+
+    # A sync generator: Starlette iterates it in its thread pool, off the event loop
+    return StreamingResponse(stream(), media_type='application/x-ndjson')
+
+
+async def prometheus_metrics(request):
+    return Response(render_metrics(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+
+async def pool_stats(request):
+    """Sync session pool counters (used by /jobs workers); the async pool is managed by httpx."""
+    return JSONResponse(core.HTTP_POOL.stats())
+
+
+async def parse_stats(request):
+    return JSONResponse(core.PARSE_EXECUTOR.stats())
+
+
+async def cache_stats(request):
+    return JSONResponse({"scrape": core.SCRAPE_CACHE.stats(), "ai": core.AI_CACHE.stats(),
+                         "near_dup": core.NEAR_DUP.stats(), "compaction": core.COMPACTOR.stats()})
+
+
+async def job_stats(request):
+    return JSONResponse(core.JOB_QUEUE.stats())
+
+
+@asynccontextmanager
+async def lifespan(application):
+    global HTTP_CLIENT, _AI_SEMAPHORE
+    # Semaphores bind to the loop that first waits on them
+    _HOST_SEMAPHORES.clear()
+    _AI_SEMAPHORE = None
+    http_client()
+    try:
+        yield
+    finally:
+        if HTTP_CLIENT is not None:
+            await HTTP_CLIENT.aclose()
+            HTTP_CLIENT = None
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/extract', extract_data, methods=['POST']),
+        Route('/jobs', submit_job, methods=['POST']),
+        Route('/jobs/{job_id}', get_job),
+        Route('/extract_batch', extract_batch, methods=['POST']),
+        Route('/crawl', crawl, methods=['POST']),
+        Route('/metrics', prometheus_metrics),
+        Route('/stats/pool', pool_stats),
+        Route('/stats/parse', parse_stats),
+        Route('/stats/cache', cache_stats),
+        Route('/stats/jobs', job_stats),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "8000")))
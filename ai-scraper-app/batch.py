@@ -0,0 +1,198 @@
+"""Concurrent batch execution for /extract_batch.
+
+Pages are fetched on one thread pool (with a per-host connection cap) and handed
+to a second, smaller pool for AI extraction, which is also rate limited. Results
+are yielded in completion order so a slow page never holds up the rest.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from http_pool import host_key
+
+# --- Batch Configuration (override via environment) ---
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "100"))
+BATCH_FETCH_WORKERS = int(os.getenv("BATCH_FETCH_WORKERS", "16"))
+BATCH_PER_HOST = int(os.getenv("BATCH_PER_HOST", "4"))
+BATCH_AI_WORKERS = int(os.getenv("BATCH_AI_WORKERS", "4"))
+# Sustained AI calls per second across all batches; burst allows short spikes
+BATCH_AI_RATE = float(os.getenv("BATCH_AI_RATE", "5"))
+BATCH_AI_BURST = int(os.getenv("BATCH_AI_BURST", "5"))
+
+
+class HostLimiter:
+    """Caps how many fetches run against the same host at once.
+
+    Only hosts with a fetch running or waiting keep a semaphore, so the table
+    stays as small as the current work instead of growing with every host seen.
+    """
+
+    def __init__(self, per_host=BATCH_PER_HOST):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}  # host -> [semaphore, fetches holding or waiting for it]
+
+    @contextmanager
+    def slot(self, url):
+        key = host_key(url)
+        with self._lock:
+            entry = self._semaphores.get(key)
+            if entry is None:
+                entry = self._semaphores[key] = [threading.BoundedSemaphore(self.per_host), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._semaphores[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._semaphores)
+
+
+class RateLimiter:
+    """Token bucket: acquire() blocks until a call is allowed."""
+
+    def __init__(self, rate=BATCH_AI_RATE, burst=BATCH_AI_BURST):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """acquire() for event-loop callers: waits with asyncio.sleep instead of blocking."""
+        import asyncio  # only the ASGI app needs it; keeps `import app` cheap
+
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+def validate_jobs(jobs):
+    """Returns an error message for a malformed jobs list, or None."""
+    if not isinstance(jobs, list) or not jobs:
+        return "'jobs' must be a non-empty list of {url, instruction} objects"
+    if len(jobs) > BATCH_MAX_JOBS:
+        return f"Too many jobs ({len(jobs)}); the limit is {BATCH_MAX_JOBS}"
+    return None
+
+
+def _track(futures, future):
+    # Only unfinished futures are kept, for cancellation
+    futures.add(future)
+    future.add_done_callback(futures.discard)
+
+
+class BatchRunner:
+    """Runs scrape -> extract for many jobs with separate fetch and AI concurrency."""
+
+    def __init__(self, scrape_fn, fetch_workers=BATCH_FETCH_WORKERS,
+                 ai_workers=BATCH_AI_WORKERS, per_host=BATCH_PER_HOST,
+                 rate_limiter=None):
+        # scrape_fn(url) -> text or "Error..." string
+        self.scrape_fn = scrape_fn
+        self.hosts = HostLimiter(per_host)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self._fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="batch-fetch")
+        self._ai_pool = ThreadPoolExecutor(max_workers=ai_workers, thread_name_prefix="batch-ai")
+
+    def run(self, jobs, extract_fn, max_pending=None):
+        """Yields one result dict per job, in the order they finish.
+
+        extract_fn(text, instruction, url) -> (result dict, served_from_cache)
+        jobs may be any iterable. With max_pending, it is read lazily and at most
+        that many jobs are in flight, so memory stays flat for very long inputs.
+        """
+        results = queue.Queue()
+        futures = set()
+        jobs = enumerate(jobs)
+        pending = 0
+
+        def fill():
+            nonlocal pending
+            while max_pending is None or pending < max_pending:
+                next_job = next(jobs, None)
+                if next_job is None:
+                    return
+                index, job = next_job
+                url = job.get("url") if isinstance(job, dict) else None
+                instruction = job.get("instruction") if isinstance(job, dict) else None
+                if not url or not instruction:
+                    results.put({"index": index, "url": url, "error": "Missing URL or instruction"})
+                else:
+                    _track(futures, self._fetch_pool.submit(self._fetch, index, url, instruction, extract_fn,
+                                                            results, futures))
+                pending += 1
+
+        try:
+            fill()
+            while pending:
+                yield results.get()
+                pending -= 1
+                fill()
+        finally:
+            # Client went away mid-stream: drop whatever has not started yet
+            for future in list(futures):
+                future.cancel()
+
+    def _fetch(self, index, url, instruction, extract_fn, results, futures):
+        started = time.monotonic()
+        try:
+            with self.hosts.slot(url):
+                text = self.scrape_fn(url)
+        except Exception as e:
+            text = f"Error Scraping: {type(e).__name__} - {e}"
+
+        if text.startswith("Error"):
+            results.put({"index": index, "url": url, "error": text, "elapsed": round(time.monotonic() - started, 3)})
+            return
+        _track(futures, self._ai_pool.submit(self._extract, index, url, instruction, text, extract_fn, results, started))
+
+    def _extract(self, index, url, instruction, text, extract_fn, results, started):
+        try:
+            self.rate_limiter.acquire()
+            data, from_cache = extract_fn(text, instruction, url)
+        except Exception as e:
+            data, from_cache = {"error": f"AI extraction failed: {type(e).__name__} - {e}"}, False
+
+        item = {"index": index, "url": url, "elapsed": round(time.monotonic() - started, 3)}
+        if "error" in data:
+            item["error"] = data["error"]
+        else:
+            item["data"] = data
+            item["cached"] = from_cache is True
+            if from_cache == "near_dup":
+                item["near_dup"] = True
+        results.put(item)
@@ -0,0 +1,468 @@
+"""Offline benchmark for the scrape -> extract pipeline.
+
+Serves the HTML fixtures (plus generated large pages) from a local HTTP server
+and swaps the OpenAI client for a fake with configurable latency, so runs need
+no network or API key and are comparable across commits.
+
+    python benchmark.py                       # all scenarios, default sizes
+    python benchmark.py --requests 200 --llm-latency 50 --output results.json
+    python benchmark.py --compare bench_results/previous.json
+
+Reports throughput, p50/p95/p99 latency and peak RSS per stage (scrape,
+extract, end_to_end) for the single, batch and cached scenarios.
+
+    python benchmark.py --scenarios parse-inline parse-thread parse-process
+
+times only the HTML -> text parse of the corpus pages, issued from
+--parse-clients threads (like a threaded server), once per parse_pool mode.
+"""
+
+import argparse
+import bisect
+import glob
+import http.server
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(HERE, "fixtures")
+RESULTS_DIR = os.path.join(HERE, "bench_results")
+
+PIPELINE_SCENARIOS = ("single", "batch", "cached")
+PARSE_SCENARIOS = ("parse-inline", "parse-thread", "parse-process")
+SCENARIOS = PIPELINE_SCENARIOS + PARSE_SCENARIOS
+STAGES = ("scrape", "extract", "parse", "end_to_end")
+INSTRUCTION = "Extract the page title and a one-sentence summary. Return JSON with keys 'title' and 'summary'."
+
+
+# --- Local Corpus Server ---
+
+def load_corpus(large_copies=200):
+    """Fixture pages by name, plus 'large' (the article repeated) to exercise big downloads."""
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, "rb") as f:
+            corpus[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    article = corpus.get("article", b"<p>filler</p>")
+    body_start = article.find(b"<body>")
+    body = article[body_start + len(b"<body>"):] if body_start >= 0 else article
+    corpus["large"] = article.replace(b"</body>", body * large_copies + b"</body>", 1)
+    return corpus
+
+
+def start_corpus_server(corpus):
+    """Serves /page/<name>?v=<n> from memory with keep-alive and an ETag per page."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; avoid the Nagle/delayed-ACK stall
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            name = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+            body = corpus.get(name)
+            if body is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            etag = f'"{name}-{len(body)}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # Streaming parse closes the connection once it has enough text
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+        # The default backlog of 5 drops SYNs when the async mode connects hundreds at once
+        request_queue_size = 512
+
+        def handle_error(self, request, client_address):
+            # Early-closing clients reset keep-alive sockets; that is expected here
+            if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+                super().handle_error(request, client_address)
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Fake OpenAI Client ---
+
+class FakeCompletions:
+    """Stands in for client.chat.completions with a fixed latency and a JSON reply."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        content = messages[-1]["content"]
+        text = content.split("--- Content to process ---", 1)[-1].strip()
+        title = text.split("\n", 1)[0][:80]
+        reply = json.dumps({"title": title, "summary": text[:120]})
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=reply))],
+            usage=types.SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(reply) // 4,
+                                        total_tokens=prompt_tokens + len(reply) // 4),
+        )
+
+
+def fake_client(latency):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=FakeCompletions(latency)))
+
+
+# --- Measurement ---
+
+def current_rss():
+    """Resident set size in bytes (Linux /proc, else peak RSS from getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Recorder:
+    """Collects per-stage call intervals and samples RSS in the background."""
+
+    def __init__(self, sample_interval=0.005):
+        self.sample_interval = sample_interval
+        self.spans = {stage: [] for stage in STAGES}
+        self.samples = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.samples.append((time.perf_counter(), current_rss()))
+            time.sleep(self.sample_interval)
+
+    def record(self, stage, started, ended):
+        with self._lock:
+            self.spans[stage].append((started, ended))
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, started, time.perf_counter())
+        return timed
+
+    def peak_rss(self, stage):
+        """Highest RSS sampled while the stage ran (or just before, for very short spans)."""
+        samples = list(self.samples)
+        times = [ts for ts, _ in samples]
+        peak = 0
+        for start, end in self.spans[stage]:
+            lo = bisect.bisect_left(times, start)
+            hi = bisect.bisect_right(times, end)
+            window = samples[lo:hi] or samples[max(hi - 1, 0):hi]
+            for _, rss in window:
+                peak = max(peak, rss)
+        return peak
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(recorder, wall):
+    stages = {}
+    for stage in STAGES:
+        durations = sorted(end - start for start, end in recorder.spans[stage])
+        if not durations:
+            continue
+        stages[stage] = {
+            "count": len(durations),
+            "throughput_rps": round(len(durations) / wall, 2) if wall else 0.0,
+            "mean_ms": round(1000 * sum(durations) / len(durations), 3),
+            "p50_ms": round(1000 * percentile(durations, 50), 3),
+            "p95_ms": round(1000 * percentile(durations, 95), 3),
+            "p99_ms": round(1000 * percentile(durations, 99), 3),
+            "peak_rss_mb": round(recorder.peak_rss(stage) / (1024 * 1024), 2),
+        }
+    return {"wall_seconds": round(wall, 3), "stages": stages}
+
+
+# --- Scenarios ---
+
+def build_urls(server, corpus, count, tag):
+    names = sorted(corpus)
+    base = f"http://127.0.0.1:{server.server_port}/page"
+    # A distinct query per request keeps the scrape cache cold where intended
+    return [f"{base}/{names[i % len(names)]}?v={tag}-{i}" for i in range(count)]
+
+
+def instrument(app_module, recorder):
+    """Points the app's stage functions at timed wrappers; returns an undo callable."""
+    originals = {
+        "scrape_url": app_module.scrape_url,
+        "extract_with_ai_cached": app_module.extract_with_ai_cached,
+    }
+    app_module.scrape_url = recorder.wrap("scrape", originals["scrape_url"])
+    app_module.extract_with_ai_cached = recorder.wrap("extract", originals["extract_with_ai_cached"])
+
+    def undo():
+        for name, fn in originals.items():
+            setattr(app_module, name, fn)
+    return undo
+
+
+def run_single(app_module, urls, recorder, mode="auto"):
+    """Sequential /extract-style calls with both caches bypassed; returns wall seconds."""
+    wall_started = time.perf_counter()
+    for url in urls:
+        started = time.perf_counter()
+        app_module.run_extraction(url, INSTRUCTION, cache_mode="bypass", mode=mode)
+        recorder.record("end_to_end", started, time.perf_counter())
+    return time.perf_counter() - wall_started
+
+
+def run_batch(app_module, urls, recorder):
+    """All URLs through BATCH_RUNNER at once; returns wall seconds."""
+    started = time.perf_counter()
+
+    def extract(text, instruction, url):
+        return app_module.extract_first_chunk(text, url, instruction, "bypass")
+
+    jobs = [{"url": url, "instruction": INSTRUCTION} for url in urls]
+    for item in app_module.BATCH_RUNNER.run(jobs, extract):
+        # Batch items finish independently; latency is measured from batch start
+        recorder.record("end_to_end", started, started + item.get("elapsed", 0.0))
+    return time.perf_counter() - started
+
+
+def run_cached(app_module, urls, recorder, mode="auto"):
+    """Repeat pass over URLs already in both caches; returns wall seconds of that pass."""
+    # Warm both caches untimed, then measure the repeat pass
+    warm = Recorder()
+    undo_warm = instrument(app_module, warm)
+    try:
+        for url in urls:
+            app_module.run_extraction(url, INSTRUCTION, cache_mode="prefer", mode=mode)
+    finally:
+        undo_warm()
+
+    undo = instrument(app_module, recorder)
+    wall_started = time.perf_counter()
+    try:
+        for url in urls:
+            started = time.perf_counter()
+            app_module.run_extraction(url, INSTRUCTION, cache_mode="prefer", mode=mode)
+            recorder.record("end_to_end", started, time.perf_counter())
+    finally:
+        undo()
+    return time.perf_counter() - wall_started
+
+
+def run_parse(mode, corpus, args, recorder):
+    """args.requests parses of the corpus pages from args.parse_clients threads; returns wall seconds."""
+    from concurrent.futures import ThreadPoolExecutor
+    from parse_pool import ParseExecutor
+
+    executor = ParseExecutor(mode=mode, workers=args.parse_workers, inline_bytes=args.parse_inline_bytes)
+    pages = [corpus[name] for name in sorted(corpus)]
+    # Start the pool's workers outside the timed window
+    largest = max(pages, key=len)
+    for future in [executor.submit(largest) for _ in range(executor.workers)]:
+        future.result()
+
+    timed_parse = recorder.wrap("parse", executor.parse)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.parse_clients) as clients:
+        list(clients.map(timed_parse, (pages[i % len(pages)] for i in range(args.requests))))
+    wall = time.perf_counter() - started
+    executor.close()
+    return wall
+
+
+def load_app(work_dir):
+    """Imports app.py against throwaway cache locations."""
+    os.environ["AI_CACHE_PATH"] = os.path.join(work_dir, "ai_cache.sqlite3")
+    os.environ.pop("SCRAPE_CACHE_DIR", None)
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    import app as app_module
+    return app_module
+
+
+def run_benchmarks(args):
+    corpus = load_corpus(args.large_copies)
+    server = start_corpus_server(corpus)
+    work_dir = tempfile.mkdtemp(prefix="scraper-bench-")
+    app_module = load_app(work_dir)
+    from scrape_cache import ScrapeCache
+
+    app_module.client = fake_client(args.llm_latency / 1000.0)
+    completions = app_module.client.chat.completions
+    # The batch AI rate limiter is a cost policy, not pipeline speed; off by default here
+    app_module.BATCH_RUNNER.rate_limiter.rate = args.batch_ai_rate
+
+    results = {}
+    for scenario in args.scenarios:
+        if scenario in PARSE_SCENARIOS:
+            recorder = Recorder()
+            recorder.start()
+            wall = run_parse(scenario.split("-", 1)[1], corpus, args, recorder)
+            recorder.stop()
+            results[scenario] = summarize(recorder, wall)
+            results[scenario]["llm_calls"] = 0
+            continue
+
+        app_module.SCRAPE_CACHE = ScrapeCache()
+        urls = build_urls(server, corpus, args.requests, scenario)
+        recorder = Recorder()
+        recorder.start()
+        if scenario == "cached":
+            wall = run_cached(app_module, urls, recorder, args.extract_mode)
+        else:
+            undo = instrument(app_module, recorder)
+            try:
+                if scenario == "single":
+                    wall = run_single(app_module, urls, recorder, args.extract_mode)
+                else:
+                    wall = run_batch(app_module, urls, recorder)
+            finally:
+                undo()
+        recorder.stop()
+        results[scenario] = summarize(recorder, wall)
+        results[scenario]["llm_calls"] = completions.calls
+        completions.calls = 0
+
+    server.shutdown()
+    return results
+
+
+# --- Reporting ---
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results):
+    for scenario, data in results.items():
+        print(f"\n[{scenario}] wall {data['wall_seconds']}s, llm calls {data['llm_calls']}")
+        print(f"  {'stage':<11}{'count':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>9}")
+        for stage, s in data["stages"].items():
+            print(f"  {stage:<11}{s['count']:>7}{s['throughput_rps']:>9}{s['p50_ms']:>10}"
+                  f"{s['p95_ms']:>10}{s['p99_ms']:>10}{s['peak_rss_mb']:>9}")
+
+
+def print_comparison(current, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} ({baseline.get('meta', {}).get('commit')}):")
+    for scenario, data in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(scenario)
+        if not old:
+            continue
+        for stage, s in data["stages"].items():
+            o = old["stages"].get(stage)
+            if not o:
+                continue
+            deltas = []
+            for key in ("p50_ms", "p95_ms", "throughput_rps"):
+                if o[key]:
+                    deltas.append(f"{key} {100.0 * (s[key] - o[key]) / o[key]:+.1f}%")
+            print(f"  {scenario}/{stage}: {', '.join(deltas)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline scrape -> extract benchmark")
+    parser.add_argument("--requests", type=int, default=60, help="requests per scenario")
+    parser.add_argument("--llm-latency", type=float, default=20.0, help="fake model latency in ms")
+    parser.add_argument("--large-copies", type=int, default=200, help="size multiplier for the 'large' page")
+    parser.add_argument("--batch-ai-rate", type=float, default=0.0,
+                        help="AI calls/s for the batch scenario (0 disables the rate limiter)")
+    parser.add_argument("--extract-mode", choices=("auto", "llm", "structured"), default="auto",
+                        help="/extract mode for the single and cached scenarios")
+    parser.add_argument("--parse-clients", type=int, default=8, help="concurrent callers for parse-* scenarios")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1,
+                        help="thread/process pool size for parse-* scenarios")
+    parser.add_argument("--parse-inline-bytes", type=int, default=32 * 1024,
+                        help="pages smaller than this are parsed inline in parse-* scenarios")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(PIPELINE_SCENARIOS))
+    parser.add_argument("--output", help="results JSON path (default: bench_results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to print deltas against")
+    args = parser.parse_args(argv)
+
+    scenarios = run_benchmarks(args)
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "scenarios": scenarios,
+    }
+
+    print_report(scenarios)
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{commit or 'nogit'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        print_comparison(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
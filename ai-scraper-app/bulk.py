@@ -0,0 +1,441 @@
+"""Resumable bulk extraction from the command line.
+
+Reads {url, instruction} jobs from a file and runs them through the same
+scrape_url / extract_with_ai path as the API, concurrently (BatchRunner's fetch
+and AI pools, per-host cap and AI rate limit). Finished jobs are checkpointed
+in SQLite together with how far the output has been written, so a restarted
+run skips them and the output never holds half-committed rows. A checkpoint
+records the output it belongs to; existing results without their checkpoint
+are never touched unless --overwrite is given. Jobs rerun with --retry-errors
+replace their earlier error row: the output is compacted at the end of the run
+so every id has exactly one row, its latest.
+
+    python bulk.py urls.jsonl -o results.jsonl
+    python bulk.py urls.txt -i "Return JSON with keys 'title' and 'price'" -o results.parquet
+
+Input: .jsonl (objects with url, instruction, optional id), .csv (same
+columns) or plain text (one URL per line, instruction from -i). Output:
+.jsonl, or .parquet, which writes a directory of part files
+(pip install pyarrow) readable as one dataset.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from ai_cache import CACHE_MODES
+
+# --- Bulk Configuration (override via environment or flags) ---
+BULK_FETCH_WORKERS = int(os.getenv("BULK_FETCH_WORKERS", "16"))
+BULK_AI_WORKERS = int(os.getenv("BULK_AI_WORKERS", "4"))
+BULK_PER_HOST = int(os.getenv("BULK_PER_HOST", "4"))
+BULK_AI_RATE = float(os.getenv("BULK_AI_RATE", "5"))
+# Results are made durable (output flushed + checkpoint committed) this often
+BULK_COMMIT_ROWS = int(os.getenv("BULK_COMMIT_ROWS", "100"))
+BULK_COMMIT_SECONDS = float(os.getenv("BULK_COMMIT_SECONDS", "5"))
+BULK_PROGRESS_SECONDS = float(os.getenv("BULK_PROGRESS_SECONDS", "5"))
+
+PART_RE = re.compile(r"part-(\d+)\.parquet$")
+PARQUET_COLUMNS = ("id", "url", "instruction", "status", "data", "error", "cached", "elapsed", "finished_at")
+
+
+# --- Input ---
+
+def job_id(url, instruction):
+    return hashlib.sha256(f"{url}\0{instruction}".encode("utf-8")).hexdigest()[:24]
+
+
+def read_jobs(path, default_instruction=None):
+    """Yields {id, url, instruction} dicts from a .jsonl, .csv or plain URL-list file."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if ext in (".jsonl", ".ndjson"):
+            records = (json.loads(line) for line in f if line.strip())
+        elif ext == ".csv":
+            records = csv.DictReader(f)
+        else:
+            records = ({"url": line.strip()} for line in f if line.strip() and not line.lstrip().startswith("#"))
+        for record in records:
+            url = (record.get("url") or "").strip()
+            instruction = record.get("instruction") or default_instruction
+            yield {"id": record.get("id") or job_id(url, instruction), "url": url, "instruction": instruction}
+
+
+# --- Checkpoint ---
+
+class Checkpoint:
+    """SQLite record of finished job ids plus the output position they were committed with."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS done (id TEXT PRIMARY KEY, status TEXT NOT NULL, finished_at REAL);"
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);"
+        )
+
+    def status(self, item_id):
+        """'ok' or 'error' for a finished job, None if it has not run."""
+        row = self._conn.execute("SELECT status FROM done WHERE id = ?", (item_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_state(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def reset(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM done")
+            self._conn.execute("DELETE FROM state")
+
+    def commit(self, finished, state):
+        """Marks [(id, status, finished_at)] done and saves the sink state in one transaction."""
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO done (id, status, finished_at) VALUES (?, ?, ?)", finished)
+            self._conn.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                                   [(key, json.dumps(value)) for key, value in state.items()])
+
+    def close(self):
+        self._conn.close()
+
+
+# --- Output ---
+
+class JsonlSink:
+    """Appends one JSON object per line; rows past the last checkpoint are cut off on resume."""
+
+    def __init__(self, path, checkpoint):
+        self.path = path
+        committed = checkpoint.get_state("jsonl_offset", 0)
+        self._file = open(path, "ab")
+        size = self._file.seek(0, os.SEEK_END)
+        if size > committed:
+            # Written after the last checkpoint commit; those jobs are not marked done and will rerun
+            self._file.truncate(committed)
+            self._file.seek(committed)
+
+    def write(self, row):
+        self._file.write(json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"jsonl_offset": self._file.tell()}
+
+    def compact(self, checkpoint):
+        """Rewrites the file keeping only the last row per id."""
+        self._file.close()
+        last = {}
+        with open(self.path, "rb") as f:
+            for number, line in enumerate(f):
+                last[json.loads(line)["id"]] = number
+        with open(self.path, "rb") as f, open(self.path + ".tmp", "wb") as out:
+            for number, line in enumerate(f):
+                if last[json.loads(line)["id"]] == number:
+                    out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        self._file = open(self.path, "ab")
+        checkpoint.commit([], {"jsonl_offset": self._file.seek(0, os.SEEK_END), "superseded": 0})
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """Writes each commit's rows as one part-NNNNN.parquet file in the output directory."""
+
+    def __init__(self, path, checkpoint):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.path = path
+        self.schema = pa.schema([
+            ("id", pa.string()), ("url", pa.string()), ("instruction", pa.string()), ("status", pa.string()),
+            # Extraction output varies per instruction, so it is stored as JSON text
+            ("data", pa.string()), ("error", pa.string()), ("cached", pa.bool_()),
+            ("elapsed", pa.float64()), ("finished_at", pa.float64()),
+        ])
+        self.base = checkpoint.get_state("parquet_base", 0)
+        self.parts = checkpoint.get_state("parquet_parts", 0)
+        os.makedirs(path, exist_ok=True)
+        self._remove_parts(lambda number: number < self.base or number >= self.parts)
+        self._rows = []
+
+    def _remove_parts(self, stale):
+        for name in os.listdir(self.path):
+            # Unfinished writes, parts renamed after the last checkpoint commit and
+            # parts a committed compaction replaced
+            part = PART_RE.match(name)
+            if name.endswith(".parquet.tmp") or (part and stale(int(part.group(1)))):
+                os.remove(os.path.join(self.path, name))
+
+    def _part(self, number):
+        return os.path.join(self.path, f"part-{number:05d}.parquet")
+
+    def write(self, row):
+        row = dict(row, data=json.dumps(row["data"], ensure_ascii=False) if row.get("data") is not None else None)
+        self._rows.append(row)
+
+    def flush(self):
+        if self._rows:
+            import pyarrow.parquet as pq
+
+            table = self.pa.Table.from_pylist([{c: row.get(c) for c in PARQUET_COLUMNS} for row in self._rows],
+                                              schema=self.schema)
+            final = self._part(self.parts)
+            pq.write_table(table, final + ".tmp", compression="zstd")
+            os.replace(final + ".tmp", final)
+            self.parts += 1
+            self._rows = []
+        return {"parquet_parts": self.parts}
+
+    def compact(self, checkpoint):
+        """Merges the parts into one, keeping only the last row per id.
+
+        The old parts are only removed once the checkpoint has committed the
+        merged one, so an interrupted compaction leaves the output as it was.
+        """
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        numbers = range(self.base, self.parts)
+        last = {}
+        for number in numbers:
+            for offset, item_id in enumerate(pq.read_table(self._part(number), columns=["id"])["id"].to_pylist()):
+                last[item_id] = (number, offset)
+        final = self._part(self.parts)
+        with pq.ParquetWriter(final + ".tmp", self.schema, compression="zstd") as writer:
+            for number in numbers:
+                table = pq.read_table(self._part(number), schema=self.schema)
+                keep = [last[item_id] == (number, offset) for offset, item_id in enumerate(table["id"].to_pylist())]
+                writer.write_table(pc.filter(table, keep))
+        os.replace(final + ".tmp", final)
+        self.base, self.parts = self.parts, self.parts + 1
+        checkpoint.commit([], {"parquet_base": self.base, "parquet_parts": self.parts, "superseded": 0})
+        self._remove_parts(lambda number: number < self.base)
+
+    def close(self):
+        pass
+
+
+def has_results(path):
+    """Whether an output path already holds rows (a non-empty .jsonl or Parquet part files)."""
+    if os.path.isdir(path):
+        return any(PART_RE.match(name) for name in os.listdir(path))
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+def claim_output(path, checkpoint, overwrite=False):
+    """Ties the checkpoint to this output; returns an error message instead if that could lose results."""
+    output = os.path.abspath(path)
+    owner = checkpoint.get_state("output")
+    if not overwrite:
+        if owner is not None and owner != output:
+            return (f"The checkpoint {checkpoint.path} belongs to {owner}, not {output}. "
+                    "Use another --checkpoint, or --overwrite to start this output over.")
+        if owner is None and has_results(path):
+            return (f"{path} already has results but no checkpoint for them (looked in {checkpoint.path}). "
+                    "Pass that run's --checkpoint to resume it, or --overwrite to replace it.")
+    elif owner != output or has_results(path):
+        # Start over: the sink truncates/clears the output down to the (now empty) checkpoint state
+        checkpoint.reset()
+    checkpoint.commit([], {"output": output})
+    return None
+
+
+def open_sink(path, checkpoint):
+    if path.endswith(".parquet"):
+        try:
+            return ParquetSink(path, checkpoint)
+        except ImportError:
+            print("❌ Parquet output needs pyarrow (pip install pyarrow); use a .jsonl output instead.")
+            return None
+    return JsonlSink(path, checkpoint)
+
+
+# --- Runner ---
+
+class Progress:
+    """Periodic one-line progress: done/total, rate, errors and ETA."""
+
+    def __init__(self, total, interval=BULK_PROGRESS_SECONDS):
+        self.total = total
+        self.interval = interval
+        self.started = time.monotonic()
+        self._last = self.started
+        self.ok = self.errors = self.skipped = 0
+
+    @property
+    def done(self):
+        return self.ok + self.errors
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed else 0.0
+
+    def line(self):
+        remaining = self.total - self.skipped - self.done
+        rate = self.rate()
+        eta = f"{remaining / rate:.0f}s" if rate and remaining > 0 else "-"
+        return (f"⏳ {self.skipped + self.done}/{self.total} | {self.ok} ok, {self.errors} errors, "
+                f"{self.skipped} skipped | {rate:.1f} jobs/s | ETA {eta}")
+
+    def tick(self, force=False):
+        now = time.monotonic()
+        if force or now - self._last >= self.interval:
+            self._last = now
+            print(self.line(), file=sys.stderr, flush=True)
+
+
+def run(args):
+    import app as core
+    from batch import BatchRunner, RateLimiter
+
+    if os.path.splitext(args.input)[1].lower() not in (".jsonl", ".ndjson", ".csv") and not args.instruction:
+        print("❌ A plain URL list needs --instruction.")
+        return 2
+
+    checkpoint = Checkpoint(args.checkpoint or args.output.rstrip("/\\") + ".checkpoint.sqlite3")
+    error = claim_output(args.output, checkpoint, args.overwrite)
+    if error:
+        print(f"❌ {error}")
+        checkpoint.close()
+        return 2
+    sink = open_sink(args.output, checkpoint)
+    if sink is None:
+        checkpoint.close()
+        return 2
+
+    total = sum(1 for _ in read_jobs(args.input, args.instruction))
+    progress = Progress(total, args.progress)
+    inflight = {}  # BatchRunner index -> job
+    retried = set()  # ids whose earlier error row a new row supersedes
+    superseded = checkpoint.get_state("superseded", 0)
+
+    def pending_jobs():
+        seen = set()
+        index = 0
+        for job in read_jobs(args.input, args.instruction):
+            status = checkpoint.status(job["id"])
+            if job["id"] in seen or status == "ok" or (status == "error" and not args.retry_errors):
+                progress.skipped += 1
+                continue
+            if status is not None:
+                retried.add(job["id"])
+            seen.add(job["id"])
+            inflight[index] = job
+            index += 1
+            yield job
+
+    def extract(text, instruction, url):
+        return core.extract_first_chunk(text, url, instruction, args.cache)
+
+    runner = BatchRunner(lambda url: core.scrape_url(url, max_chars=core.MAX_AI_CHARS),
+                         fetch_workers=args.fetch_workers, ai_workers=args.ai_workers,
+                         per_host=args.per_host, rate_limiter=RateLimiter(rate=args.ai_rate))
+    max_pending = max(1, 4 * (args.fetch_workers + args.ai_workers))
+
+    finished = []
+    last_commit = time.monotonic()
+
+    def commit():
+        nonlocal finished, last_commit
+        checkpoint.commit(finished, dict(sink.flush(), superseded=superseded))
+        finished, last_commit = [], time.monotonic()
+
+    print(f"🚀 {total} jobs from {args.input} -> {args.output}", file=sys.stderr)
+    results = runner.run(pending_jobs(), extract, max_pending=max_pending)
+    try:
+        for item in results:
+            job = inflight.pop(item["index"])
+            status = "error" if "error" in item else "ok"
+            row = {
+                "id": job["id"], "url": job["url"], "instruction": job["instruction"], "status": status,
+                "data": item.get("data"), "error": item.get("error"), "cached": item.get("cached"),
+                "elapsed": item.get("elapsed"), "finished_at": time.time(),
+            }
+            sink.write(row)
+            if job["id"] in retried:
+                superseded += 1
+            finished.append((job["id"], status, row["finished_at"]))
+            if status == "ok":
+                progress.ok += 1
+            else:
+                progress.errors += 1
+            if len(finished) >= args.commit_rows or time.monotonic() - last_commit >= args.commit_seconds:
+                commit()
+            progress.tick()
+    except KeyboardInterrupt:
+        print("\n⚠️ Interrupted; saving progress. Run the same command again to resume.", file=sys.stderr)
+        return_code = 130
+    else:
+        return_code = 0
+        if superseded:
+            commit()
+            sink.compact(checkpoint)
+            superseded = 0
+    finally:
+        results.close()
+        commit()
+        sink.close()
+        checkpoint.close()
+
+    progress.tick(force=True)
+    print(f"✅ {progress.ok} ok, {progress.errors} errors, {progress.skipped} skipped in "
+          f"{time.monotonic() - progress.started:.1f}s ({progress.rate():.1f} jobs/s)", file=sys.stderr)
+    return return_code
+
+
+def check_retry_errors():
+    """Offline check that --retry-errors leaves one row per id; returns an error message or None."""
+    import contextlib
+    import io
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = os.path.join(tmp, "jobs.txt")
+        output = os.path.join(tmp, "out.jsonl")
+        with open(jobs, "w", encoding="utf-8") as f:
+            # Malformed URLs fail before any network access, so every run errors again
+            f.write("http://[::1\nhttp://host:99999/\n")
+        with contextlib.redirect_stderr(io.StringIO()):
+            for extra in ([], ["--retry-errors"], ["--retry-errors"]):
+                main([jobs, "-i", "title", "-o", output, "--cache", "bypass", "--progress", "3600"] + extra)
+        with open(output, encoding="utf-8") as f:
+            ids = [json.loads(line)["id"] for line in f]
+    if len(ids) != 2 or len(set(ids)) != 2:
+        return f"{len(ids)} rows for {len(set(ids))} ids after --retry-errors twice"
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumable bulk scrape + AI extraction")
+    parser.add_argument("input", help=".jsonl / .csv with url, instruction[, id] or a plain list of URLs")
+    parser.add_argument("-o", "--output", required=True, help="results .jsonl, or .parquet (a directory of parts)")
+    parser.add_argument("-i", "--instruction", help="instruction for jobs that do not carry their own")
+    parser.add_argument("--checkpoint", help="checkpoint database (default: <output>.checkpoint.sqlite3)")
+    parser.add_argument("--cache", choices=CACHE_MODES, default="prefer", help="AI result cache mode")
+    parser.add_argument("--retry-errors", action="store_true", help="rerun jobs that finished with an error, replacing their error rows")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="replace existing output and start over instead of refusing")
+    parser.add_argument("--fetch-workers", type=int, default=BULK_FETCH_WORKERS)
+    parser.add_argument("--ai-workers", type=int, default=BULK_AI_WORKERS)
+    parser.add_argument("--per-host", type=int, default=BULK_PER_HOST)
+    parser.add_argument("--ai-rate", type=float, default=BULK_AI_RATE, help="AI calls per second (0 = unlimited)")
+    parser.add_argument("--commit-rows", type=int, default=BULK_COMMIT_ROWS)
+    parser.add_argument("--commit-seconds", type=float, default=BULK_COMMIT_SECONDS)
+    parser.add_argument("--progress", type=float, default=BULK_PROGRESS_SECONDS, help="seconds between progress lines")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""Token-aware chunking and map-reduce extraction for long pages.
+
+Scraped text is split on line (paragraph) boundaries into chunks that fit a
+token budget. Chunks can be ranked against the instruction so only the most
+relevant ones are sent, extracted in parallel, and the per-chunk JSON objects
+are merged with a deterministic reduce step.
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Chunking Configuration (override via environment) ---
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "1000"))
+CHUNK_MAX_CHUNKS = int(os.getenv("CHUNK_MAX_CHUNKS", "20"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "4"))
+
+# Values accepted for the `strategy` field of the /extract body
+STRATEGIES = ("first", "map_reduce")
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be by extract for from get give in into is it json key keys "
+    "list main of on only or page return result the their them this to with".split()
+)
+
+_ENCODING = None
+
+
+def count_tokens(text):
+    """Token count with tiktoken when installed, else a ~4 chars/token estimate."""
+    global _ENCODING
+    if _ENCODING is None:
+        try:
+            import tiktoken
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _ENCODING = False
+    if _ENCODING:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+def _units(sentence, budget):
+    if count_tokens(sentence) <= budget:
+        return [sentence]
+    units = []
+    for word in sentence.split():
+        if count_tokens(word) <= budget:
+            units.append(word)
+        else:
+            # Unbroken runs (base64, minified data) are sliced at ~4 chars/token
+            step = budget * 4
+            units.extend(word[i:i + step] for i in range(0, len(word), step))
+    return units
+
+
+def _split_oversized(line, budget):
+    """Breaks one line that exceeds the budget on sentences, then words, then characters."""
+    current = ""
+    for sentence in SENTENCE_RE.split(line):
+        for unit in _units(sentence, budget):
+            candidate = f"{current} {unit}" if current else unit
+            if current and count_tokens(candidate) > budget:
+                yield current
+                current = unit
+            else:
+                current = candidate
+    if current:
+        yield current
+
+
+def _lines(text):
+    start = 0
+    while start <= len(text):
+        end = text.find("\n", start)
+        if end < 0:
+            end = len(text)
+        yield text[start:end]
+        start = end + 1
+
+
+def iter_chunks(text, budget=CHUNK_TOKENS):
+    """Yields the chunks of split_chunks() one at a time, tokenizing only as far as the caller reads."""
+    lines = []
+    used = 0
+    for line in _lines(text):
+        line = line.strip()
+        if not line:
+            continue
+        tokens = count_tokens(line)
+        if tokens > budget:
+            if lines:
+                yield "\n".join(lines)
+                lines, used = [], 0
+            yield from _split_oversized(line, budget)
+            continue
+        # +1 for the newline joining this line to the previous one
+        if lines and used + tokens + 1 > budget:
+            yield "\n".join(lines)
+            lines, used = [], 0
+        lines.append(line)
+        used += tokens + (1 if used else 0)
+    if lines:
+        yield "\n".join(lines)
+
+
+def split_chunks(text, budget=CHUNK_TOKENS):
+    """Groups lines into chunks of at most `budget` tokens, never splitting a line unless it alone is too big."""
+    return list(iter_chunks(text, budget))
+
+
+def first_chunk(text, budget=CHUNK_TOKENS):
+    """The leading chunk only: a token-bounded cut that ends on a line boundary.
+
+    Stops reading at the end of that chunk, so a multi-MB page costs no more than its first budget of tokens.
+    """
+    return next(iter_chunks(text, budget), "")
+
+
+# --- Relevance Pre-filter ---
+
+def _terms(text):
+    return [w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+def rank_chunks(chunks, instruction):
+    """Chunk indexes ordered by BM25 relevance to the instruction (ties keep page order)."""
+    query = set(_terms(instruction))
+    docs = [Counter(_terms(chunk)) for chunk in chunks]
+    if not query or not docs:
+        return list(range(len(chunks)))
+
+    n = len(docs)
+    avg_len = sum(sum(d.values()) for d in docs) / n or 1
+    k1, b = 1.5, 0.75
+    scores = []
+    for index, doc in enumerate(docs):
+        length = sum(doc.values())
+        score = 0.0
+        for term in query:
+            tf = doc.get(term, 0)
+            if not tf:
+                continue
+            df = sum(1 for d in docs if term in d)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        scores.append((-score, index))
+    return [index for _, index in sorted(scores)]
+
+
+def select_chunks(chunks, instruction, top_k=None):
+    """The top_k most relevant chunks in page order (all of them when top_k is None)."""
+    if top_k is None or top_k >= len(chunks):
+        return list(range(len(chunks)))
+    return sorted(rank_chunks(chunks, instruction)[:top_k])
+
+
+# --- Reduce ---
+
+def _is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+
+def merge_values(left, right):
+    """Deterministic merge: dicts recurse, lists concatenate without duplicates, first non-empty scalar wins."""
+    if _is_empty(left):
+        return right
+    if _is_empty(right):
+        return left
+    if isinstance(left, dict) and isinstance(right, dict):
+        merged = dict(left)
+        for key, value in right.items():
+            merged[key] = merge_values(merged.get(key), value)
+        return merged
+    if isinstance(left, list) or isinstance(right, list):
+        left = left if isinstance(left, list) else [left]
+        right = right if isinstance(right, list) else [right]
+        merged = list(left)
+        for item in right:
+            if item not in merged:
+                merged.append(item)
+        return merged
+    return left
+
+
+def merge_results(results):
+    """Folds per-chunk JSON objects (in chunk order) into one object."""
+    merged = {}
+    for result in results:
+        merged = merge_values(merged, result)
+    return merged
+
+
+# --- Map-Reduce ---
+
+def _plan(text, instruction, budget, top_k, max_chunks):
+    chunks = split_chunks(text, budget)
+    limit = min(top_k, max_chunks) if top_k else max_chunks
+    selected = select_chunks(chunks, instruction, limit)
+    info = {"total_chunks": len(chunks), "used_chunks": len(selected), "failed_chunks": 0, "cached": False,
+            "tokens_sent": sum(count_tokens(chunks[i]) for i in selected)}
+    return chunks, selected, info
+
+
+def planned_tokens(text, instruction, budget=CHUNK_TOKENS, top_k=None, max_chunks=CHUNK_MAX_CHUNKS):
+    """Tokens map_reduce_extract would send for this text (the chunks it selects)."""
+    return _plan(text, instruction, budget, top_k, max_chunks)[2]["tokens_sent"]
+
+
+def _reduce(outputs, info):
+    results = [result for result, _ in outputs if "error" not in result]
+    info["failed_chunks"] = len(outputs) - len(results)
+    info["cached"] = all(from_cache is True for _, from_cache in outputs)
+    # Chunks answered with a near-identical chunk's result (see near_dup.py)
+    info["near_dup_chunks"] = sum(from_cache == "near_dup" for _, from_cache in outputs)
+    if not results:
+        # Every chunk failed: surface the first error as-is
+        return outputs[0][0], info
+    return merge_results(results), info
+
+
+def map_reduce_extract(text, instruction, extract_fn, budget=CHUNK_TOKENS, top_k=None,
+                       max_chunks=CHUNK_MAX_CHUNKS, workers=CHUNK_WORKERS):
+    """Runs extract_fn over the selected chunks in parallel and merges the results.
+
+    extract_fn(chunk, instruction) -> (result dict, served_from_cache).
+    Returns (merged result or {"error": ...}, info dict).
+    """
+    chunks, selected, info = _plan(text, instruction, budget, top_k, max_chunks)
+    if not selected:
+        return {"error": "No text content to extract from."}, info
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(selected)))) as pool:
+        outputs = list(pool.map(lambda i: extract_fn(chunks[i], instruction), selected))
+    return _reduce(outputs, info)
+
+
+async def map_reduce_extract_async(text, instruction, extract_fn, budget=CHUNK_TOKENS, top_k=None,
+                                   max_chunks=CHUNK_MAX_CHUNKS, workers=CHUNK_WORKERS):
+    """map_reduce_extract for coroutine extract_fn, with at most `workers` calls in flight."""
+    import asyncio  # used by the async path only
+
+    chunks, selected, info = _plan(text, instruction, budget, top_k, max_chunks)
+    if not selected:
+        return {"error": "No text content to extract from."}, info
+
+    semaphore = asyncio.Semaphore(max(1, workers))
+
+    async def run(index):
+        async with semaphore:
+            return await extract_fn(chunks[index], instruction)
+
+    outputs = await asyncio.gather(*(run(i) for i in selected))
+    return _reduce(list(outputs), info)
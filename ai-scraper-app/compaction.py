@@ -0,0 +1,213 @@
+"""Compaction of scraped text before it is chunked and sent to the model.
+
+Scraped text repeats itself. A headline shows up in the <h1>, the share
+widget and the breadcrumb, an author name above and below the byline, and
+every page of a site carries the same menu, cookie notice and footer links.
+All of it is paid for in prompt tokens. compact() rewrites the text line by line:
+
+- whitespace inside a line is collapsed and blank lines are dropped
+- a prose line (COMPACT_PROSE_CHARS or longer: a headline, a sentence)
+  repeating one of the previous COMPACT_WINDOW lines is dropped
+- a short multi-word line without digits (a name, a title) repeating the
+  line right before it is dropped
+- runs of at least COMPACT_MIN_RUN lines that appeared on COMPACT_BOILERPLATE_RATIO
+  of the URLs seen from the same host are dropped, once COMPACT_MIN_PAGES
+  distinct URLs from that host have been seen
+
+Lines compare ignoring case and spacing only. Punctuation is ignored just for
+prose lines without digits or currency signs, so "+5.2%" and "-5.2%", or
+"$10" and "€10", never match. Single words and numbers are never dropped as
+repeats (table cells repeat legitimately), and neither are short repeats
+further back: inline markup splits sentences into short lines ("A", "large
+language model", "(LLM) is ..."), which can repeat a heading.
+
+Only runs count as boilerplate, so a recurring label between page-specific
+lines ("Price", "Ingredients") is kept, and a page keeps its lines when
+stripping would leave less than COMPACT_MIN_KEEP of its text. Learning is per
+URL, not per fetch, so re-scraping one page whose timestamp changed never
+turns that page into boilerplate. Per-host counts live in memory, bounded in
+hosts and lines, and halve periodically so a changed template is relearned.
+
+Because of that learning, the same page compacts differently over time; the
+AI result cache is keyed on the text as scraped, not on the compacted prompt.
+Token savings are measured by the caller on what is actually sent
+(record_tokens), since a strategy may send only part of the text.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from scrape_cache import normalize_url
+
+# --- Compaction Configuration (override via environment) ---
+COMPACT_TEXT = os.getenv("COMPACT_TEXT", "1") != "0"
+# How many previous lines a prose repeat is looked for in
+COMPACT_WINDOW = int(os.getenv("COMPACT_WINDOW", "4"))
+# Lines at least this long are prose: repeats further back and punctuation-only differences count
+COMPACT_PROSE_CHARS = int(os.getenv("COMPACT_PROSE_CHARS", "32"))
+COMPACT_MIN_PAGES = int(os.getenv("COMPACT_MIN_PAGES", "5"))
+COMPACT_BOILERPLATE_RATIO = float(os.getenv("COMPACT_BOILERPLATE_RATIO", "0.5"))
+COMPACT_MIN_RUN = int(os.getenv("COMPACT_MIN_RUN", "3"))
+# Fraction of a page's characters boilerplate removal must leave, else the page is kept whole
+COMPACT_MIN_KEEP = float(os.getenv("COMPACT_MIN_KEEP", "0.25"))
+COMPACT_MAX_HOSTS = int(os.getenv("COMPACT_MAX_HOSTS", "500"))
+COMPACT_MAX_LINES = int(os.getenv("COMPACT_MAX_LINES", "5000"))
+# Counts are halved when a host reaches this many URLs
+COMPACT_HOST_PAGES = int(os.getenv("COMPACT_HOST_PAGES", "200"))
+# Compaction frees room in the first chunk, so that strategy reads this much further into the page
+COMPACT_READ_FACTOR = int(os.getenv("COMPACT_READ_FACTOR", "2"))
+
+NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+DIGIT_RE = re.compile(r"\d")
+
+
+def _is_prose(line):
+    return len(line) >= COMPACT_PROSE_CHARS
+
+
+def line_key(line):
+    """Comparison key: the line casefolded; prose without numbers or currency also drops punctuation."""
+    key = line.casefold()
+    if _is_prose(key) and not any(ch.isdigit() or unicodedata.category(ch) == "Sc" for ch in key):
+        key = NON_WORD_RE.sub(" ", key).strip() or key
+    return key
+
+
+class HostProfile:
+    """How many of a host's URLs each line key appeared on."""
+
+    def __init__(self):
+        self.pages = 0
+        self.counts = {}
+        self.seen = OrderedDict()  # normalized URLs already counted
+
+    def observe(self, page, keys):
+        if page in self.seen:
+            self.seen.move_to_end(page)
+            return
+        self.seen[page] = None
+        while len(self.seen) > COMPACT_HOST_PAGES:
+            self.seen.popitem(last=False)
+        self.pages += 1
+        for key in keys:
+            self.counts[key] = self.counts.get(key, 0) + 1
+        if self.pages >= COMPACT_HOST_PAGES:
+            self._decay()
+        elif len(self.counts) > COMPACT_MAX_LINES:
+            # One-off lines are most of the table and never boilerplate
+            self.counts = {key: count for key, count in self.counts.items() if count > 1}
+
+    def _decay(self):
+        self.pages //= 2
+        self.counts = {key: count // 2 for key, count in self.counts.items() if count > 1}
+
+    def is_boilerplate(self, key, min_pages, ratio):
+        return self.pages >= min_pages and self.counts.get(key, 0) >= self.pages * ratio
+
+
+class Compactor:
+    """Thread-safe compact(text, url) with per-host boilerplate learning (LRU of hosts)."""
+
+    def __init__(self, enabled=COMPACT_TEXT, window=COMPACT_WINDOW, min_pages=COMPACT_MIN_PAGES,
+                 ratio=COMPACT_BOILERPLATE_RATIO, min_run=COMPACT_MIN_RUN, min_keep=COMPACT_MIN_KEEP,
+                 max_hosts=COMPACT_MAX_HOSTS):
+        self.enabled = enabled
+        self.window = window
+        self.min_pages = min_pages
+        self.ratio = ratio
+        self.min_run = min_run
+        self.min_keep = min_keep
+        self.max_hosts = max_hosts
+        self._lock = threading.Lock()
+        self._hosts = OrderedDict()
+        self.counts = {"pages": 0, "duplicates": 0, "boilerplate": 0, "tokens_in": 0, "tokens_out": 0}
+
+    def _profile(self, host):
+        profile = self._hosts.get(host)
+        if profile is None:
+            profile = self._hosts[host] = HostProfile()
+            while len(self._hosts) > self.max_hosts:
+                self._hosts.popitem(last=False)
+        self._hosts.move_to_end(host)
+        return profile
+
+    def _dedupe(self, text):
+        """(line, key) pairs with whitespace collapsed and nearby repeats dropped; also the drop count."""
+        kept, dropped = [], 0
+        for line in text.splitlines():
+            line = " ".join(line.split())
+            if not line:
+                continue
+            key = line_key(line)
+            if _is_prose(line):
+                recent = kept[-self.window:]
+            elif " " in line and not DIGIT_RE.search(line):
+                recent = kept[-1:]
+            else:
+                recent = ()
+            if any(key == previous for _, previous in recent):
+                dropped += 1
+                continue
+            kept.append((line, key))
+        return kept, dropped
+
+    def _strip_boilerplate(self, lines, profile):
+        """lines without runs of min_run or more boilerplate lines."""
+        flags = [profile.is_boilerplate(hash(key), self.min_pages, self.ratio) for _, key in lines]
+        kept, run = [], []
+        for line, flag in zip(lines, flags):
+            if flag:
+                run.append(line)
+                continue
+            if len(run) < self.min_run:
+                kept.extend(run)
+            run = []
+            kept.append(line)
+        if len(run) < self.min_run:
+            kept.extend(run)
+        return kept
+
+    def compact(self, text, url=None):
+        """(compacted text, info) where info counts the dropped lines."""
+        lines, duplicates = self._dedupe(text)
+        host = (urlsplit(url).hostname or "").lower() if url else ""
+        kept = lines
+        if host:
+            keys = {hash(key) for _, key in lines}
+            with self._lock:
+                profile = self._profile(host)
+                profile.observe(normalize_url(url), keys)
+                kept = self._strip_boilerplate(lines, profile)
+            # Mostly "boilerplate" means the page is like its siblings (an index,
+            # a near-copy), not that its text is chrome; keep it whole
+            if sum(len(line) for line, _ in kept) < self.min_keep * sum(len(line) for line, _ in lines):
+                kept = lines
+        compacted = "\n".join(line for line, _ in kept)
+
+        info = {"duplicates": duplicates, "boilerplate": len(lines) - len(kept)}
+        with self._lock:
+            self.counts["pages"] += 1
+            for name in ("duplicates", "boilerplate"):
+                self.counts[name] += info[name]
+        return compacted, info
+
+    def record_tokens(self, tokens_in, tokens_out):
+        """Counts tokens a request would have sent without compaction (in) and sent with it (out)."""
+        with self._lock:
+            self.counts["tokens_in"] += tokens_in
+            self.counts["tokens_out"] += tokens_out
+
+    def stats(self):
+        with self._lock:
+            tokens_in = self.counts["tokens_in"]
+            return {
+                "enabled": self.enabled,
+                "hosts": len(self._hosts),
+                **self.counts,
+                "tokens_saved": tokens_in - self.counts["tokens_out"],
+                "saved_ratio": round(1 - self.counts["tokens_out"] / tokens_in, 4) if tokens_in else 0.0,
+            }
@@ -0,0 +1,355 @@
+"""Site crawl mode for POST /crawl.
+
+Starting from a seed URL, pages are scraped with scrape_url (which also
+returns their links), extracted, and streamed back as they finish. The
+frontier is one priority queue per host plus a heap of when each host may be
+hit next, so politeness (per-host concurrency and delay, robots.txt) never
+blocks work on other hosts. Links robots.txt disallows are dropped before they
+are queued, so they never use up a host's delay. Seen URLs go into a Bloom
+filter sized from max_pages, so memory stays bounded even at millions of URLs.
+"""
+
+import hashlib
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from http_pool import host_key
+from scrape_cache import normalize_url
+
+# --- Crawl Configuration (override via environment) ---
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "100"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+# Hard ceilings for what a single request may ask for
+CRAWL_PAGE_LIMIT = int(os.getenv("CRAWL_PAGE_LIMIT", "5000"))
+CRAWL_DEPTH_LIMIT = int(os.getenv("CRAWL_DEPTH_LIMIT", "10"))
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "2"))
+# Minimum seconds between request starts to the same host (robots.txt Crawl-delay can raise it)
+CRAWL_HOST_DELAY = float(os.getenv("CRAWL_HOST_DELAY", "1.0"))
+CRAWL_MAX_FRONTIER = int(os.getenv("CRAWL_MAX_FRONTIER", "100000"))
+CRAWL_SEEN_CAPACITY = int(os.getenv("CRAWL_SEEN_CAPACITY", "1000000"))
+# Seen-filter entries reserved per page a crawl may fetch (links found per page), up to CRAWL_SEEN_CAPACITY
+CRAWL_SEEN_PER_PAGE = int(os.getenv("CRAWL_SEEN_PER_PAGE", "200"))
+CRAWL_SEEN_ERROR_RATE = float(os.getenv("CRAWL_SEEN_ERROR_RATE", "0.001"))
+ROBOTS_TTL = float(os.getenv("ROBOTS_TTL", "3600"))
+ROBOTS_MAX_HOSTS = int(os.getenv("ROBOTS_MAX_HOSTS", "1024"))
+# robots.txt bytes read per host; rules past the cap are ignored (Google reads 500 KiB)
+ROBOTS_MAX_BYTES = int(os.getenv("ROBOTS_MAX_BYTES", str(500 * 1024)))
+# robots.txt user-agent token; '*' follows the rules for all crawlers
+ROBOTS_AGENT = os.getenv("CRAWL_ROBOTS_AGENT", "*")
+
+SKIP_EXTENSIONS = frozenset(
+    ".jpg .jpeg .png .gif .webp .svg .ico .bmp .pdf .zip .gz .tar .rar .7z .exe .dmg "
+    ".mp3 .mp4 .avi .mov .webm .woff .woff2 .ttf .css .js .json .xml .rss".split()
+)
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class BloomFilter:
+    """Fixed-size probabilistic set: no false negatives, ~error_rate false positives at capacity."""
+
+    def __init__(self, capacity=CRAWL_SEEN_CAPACITY, error_rate=CRAWL_SEEN_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def add(self, item):
+        """Adds item; returns True if it was (probably) not already present."""
+        positions = self._positions(item)
+        with self._lock:
+            new = False
+            for p in positions:
+                byte, mask = p >> 3, 1 << (p & 7)
+                if not self._bits[byte] & mask:
+                    self._bits[byte] |= mask
+                    new = True
+            if new:
+                self.count += 1
+            return new
+
+    @property
+    def nbytes(self):
+        return len(self._bits)
+
+
+class RobotsCache:
+    """robots.txt per host, fetched once and kept for ROBOTS_TTL seconds."""
+
+    def __init__(self, fetch_fn, ttl=ROBOTS_TTL, agent=ROBOTS_AGENT, max_hosts=ROBOTS_MAX_HOSTS):
+        # fetch_fn(url) -> (status code, text); raises on network errors
+        self.fetch_fn = fetch_fn
+        self.ttl = ttl
+        self.agent = agent
+        self.max_hosts = max_hosts
+        self._lock = threading.Lock()
+        self._parsers = {}  # host -> (fetched_at, RobotFileParser)
+        self.fetches = 0
+
+    def _load(self, host):
+        # Deferred: robotparser pulls in urllib.request and http.client
+        from urllib import robotparser
+
+        parser = robotparser.RobotFileParser(f"{host}/robots.txt")
+        try:
+            status, text = self.fetch_fn(f"{host}/robots.txt")
+        except Exception:
+            status, text = None, ""
+        # Same rules as RobotFileParser.read(): 401/403 forbid everything, other errors allow it
+        if status in (401, 403):
+            parser.disallow_all = True
+        elif status is None or status >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(text.splitlines())
+        parser.modified()
+        return parser
+
+    def _parser(self, url):
+        host = host_key(url)
+        now = time.time()
+        with self._lock:
+            cached = self._parsers.get(host)
+        if cached and now - cached[0] < self.ttl:
+            return cached[1]
+        parser = self._load(host)
+        with self._lock:
+            self.fetches += 1
+            self._parsers[host] = (now, parser)
+            if len(self._parsers) > self.max_hosts:
+                oldest = min(self._parsers, key=lambda h: self._parsers[h][0])
+                del self._parsers[oldest]
+        return parser
+
+    def allowed(self, url):
+        return self._parser(url).can_fetch(self.agent, url)
+
+    def crawl_delay(self, url):
+        delay = self._parser(url).crawl_delay(self.agent)
+        return float(delay) if delay else 0.0
+
+
+class Frontier:
+    """Per-host priority queues plus a heap of (next allowed start, host).
+
+    pop() only returns URLs whose host has a free slot and whose delay has
+    passed; done() frees the slot. Not thread-safe: the crawl loop owns it.
+    """
+
+    def __init__(self, per_host=CRAWL_PER_HOST, delay=CRAWL_HOST_DELAY, max_size=CRAWL_MAX_FRONTIER):
+        self.per_host = max(1, per_host)
+        self.delay = delay
+        self.max_size = max_size
+        self._queues = {}      # host -> heap of (priority, seq, url, depth)
+        self._ready = []       # heap of (ready_at, host); one entry per schedulable host
+        self._scheduled = set()
+        self._next_start = {}  # host -> earliest time for the next request start
+        self._delays = {}      # host -> per-host delay override (robots Crawl-delay)
+        self._in_flight = {}
+        self._seq = 0
+        self.size = 0
+        self.dropped = 0
+
+    def set_delay(self, host, delay):
+        self._delays[host] = max(self.delay, delay)
+
+    def _schedule(self, host):
+        if host in self._scheduled or not self._queues.get(host):
+            return
+        if self._in_flight.get(host, 0) >= self.per_host:
+            return  # rescheduled by done()
+        self._scheduled.add(host)
+        heapq.heappush(self._ready, (self._next_start.get(host, 0.0), host))
+
+    def push(self, url, depth, priority):
+        if self.size >= self.max_size:
+            self.dropped += 1
+            return False
+        host = host_key(url)
+        self._seq += 1
+        heapq.heappush(self._queues.setdefault(host, []), (priority, self._seq, url, depth))
+        self.size += 1
+        self._schedule(host)
+        return True
+
+    def pop(self, now):
+        """(url, depth, host) ready to fetch, or (None, seconds until one may be)."""
+        if not self._ready:
+            return None, None
+        ready_at, host = self._ready[0]
+        if ready_at > now:
+            return None, ready_at - now
+        heapq.heappop(self._ready)
+        self._scheduled.discard(host)
+        _, _, url, depth = heapq.heappop(self._queues[host])
+        if not self._queues[host]:
+            del self._queues[host]
+        self.size -= 1
+        self._in_flight[host] = self._in_flight.get(host, 0) + 1
+        self._next_start[host] = now + self._delays.get(host, self.delay)
+        self._schedule(host)
+        return (url, depth, host), 0.0
+
+    def done(self, host):
+        self._in_flight[host] -= 1
+        if not self._in_flight[host]:
+            del self._in_flight[host]
+        self._schedule(host)
+
+    def __len__(self):
+        return self.size
+
+
+def _terms(text):
+    return {w for w in WORD_RE.findall(text.lower()) if len(w) > 2}
+
+
+def crawlable(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return False
+    return os.path.splitext(parts.path)[1].lower() not in SKIP_EXTENSIONS
+
+
+def in_domains(url, domains):
+    host = (urlsplit(url).hostname or "").lower()
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+class Crawler:
+    """Runs crawls over scrape_fn(url, links=list) -> text (or an "Error..." string)."""
+
+    def __init__(self, scrape_fn, robots=None, workers=CRAWL_WORKERS,
+                 per_host=CRAWL_PER_HOST, host_delay=CRAWL_HOST_DELAY, rate_limiter=None):
+        self.scrape_fn = scrape_fn
+        self.robots = robots
+        self.workers = workers
+        self.per_host = per_host
+        self.host_delay = host_delay
+        self.rate_limiter = rate_limiter
+
+    def _visit(self, url, instruction, extract_fn):
+        started = time.monotonic()
+        links = []
+        text = self.scrape_fn(url, links=links)
+        item = {"url": url}
+        if text.startswith("Error"):
+            item["error"] = text
+        else:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            data, from_cache = extract_fn(text, instruction, url)
+            if "error" in data:
+                item["error"] = data["error"]
+            else:
+                item["data"] = data
+                item["cached"] = from_cache is True
+                if from_cache == "near_dup":
+                    item["near_dup"] = True
+        item["elapsed"] = round(time.monotonic() - started, 3)
+        return item, links
+
+    def crawl(self, seed, instruction, extract_fn, max_pages=CRAWL_MAX_PAGES, max_depth=CRAWL_MAX_DEPTH,
+              domains=None):
+        """Yields one result dict per fetched page as it completes, then a summary dict.
+
+        extract_fn(text, instruction, url) -> (result dict, served_from_cache). domains
+        defaults to the seed's host (subdomains included).
+        """
+        seed_host = (urlsplit(seed).hostname or "").lower()
+        domains = [d.lower().lstrip(".") for d in (domains or [seed_host])]
+        query_terms = _terms(instruction)
+
+        frontier = Frontier(self.per_host, self.host_delay)
+        seen = BloomFilter(min(CRAWL_SEEN_CAPACITY, max(1, max_pages) * CRAWL_SEEN_PER_PAGE))
+        counters = {"pages": 0, "errors": 0, "robots_blocked": 0, "off_domain": 0}
+        delays_set = set()
+
+        def enqueue(url, depth, anchor=""):
+            if depth > max_depth or not crawlable(url):
+                return
+            if not in_domains(url, domains):
+                counters["off_domain"] += 1
+                return
+            if not seen.add(normalize_url(url)):
+                return
+            if self.robots is not None:
+                host = host_key(url)
+                if host not in delays_set:
+                    delays_set.add(host)
+                    frontier.set_delay(host, self.robots.crawl_delay(url))
+                if not self.robots.allowed(url):
+                    counters["robots_blocked"] += 1
+                    return
+            # Breadth-first, but links whose anchor/URL mention the instruction go first within a depth
+            relevant = query_terms and query_terms & _terms(f"{anchor} {url}")
+            frontier.push(url, depth, depth - (0.5 if relevant else 0.0))
+
+        enqueue(seed, 0)
+        pool = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="crawl")
+        running = {}  # future -> (url, depth, host)
+        started = time.monotonic()
+        try:
+            while running or len(frontier):
+                # Launch everything the politeness rules allow right now
+                wait_for = None
+                while len(running) < self.workers and counters["pages"] + len(running) < max_pages:
+                    ready, wait_for = frontier.pop(time.monotonic())
+                    if ready is None:
+                        break
+                    url, depth, host = ready
+                    running[pool.submit(self._visit, url, instruction, extract_fn)] = (url, depth, host)
+
+                if not running:
+                    if counters["pages"] >= max_pages or wait_for is None:
+                        break
+                    time.sleep(wait_for)
+                    continue
+
+                done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth, host = running.pop(future)
+                    frontier.done(host)
+                    counters["pages"] += 1
+                    try:
+                        item, links = future.result()
+                    except Exception as e:
+                        item, links = {"url": url, "error": f"Crawl error: {type(e).__name__} - {e}"}, []
+                    if "error" in item:
+                        counters["errors"] += 1
+                    item["depth"] = depth
+                    item["links_found"] = len(links)
+                    yield item
+                    for link, anchor in links:
+                        enqueue(link, depth + 1, anchor)
+        finally:
+            # Client went away mid-stream: drop queued work, let running fetches finish in the background
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        yield {
+            "done": True,
+            **counters,
+            "frontier_left": len(frontier),
+            "frontier_dropped": frontier.dropped,
+            "seen": seen.count,
+            "seen_filter_bytes": seen.nbytes,
+            "elapsed": round(time.monotonic() - started, 3),
+        }
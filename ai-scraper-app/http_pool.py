@@ -0,0 +1,141 @@
+"""Shared HTTP session layer for scrape_url.
+
+Keeps one requests.Session per host so repeated scrapes of the same site reuse
+TCP/TLS connections instead of paying a fresh handshake on every /extract call.
+Sessions only pool connections: they keep no cookies, so one caller's Set-Cookie
+(a login, a consent banner, an A/B bucket) is never replayed on another's fetch.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# --- Pool Configuration (override via environment) ---
+POOL_CONNECTIONS = int(os.getenv("SCRAPER_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.getenv("SCRAPER_POOL_MAXSIZE", "10"))
+POOL_MAX_HOSTS = int(os.getenv("SCRAPER_POOL_MAX_HOSTS", "256"))
+RETRY_TOTAL = int(os.getenv("SCRAPER_RETRY_TOTAL", "3"))
+RETRY_BACKOFF = float(os.getenv("SCRAPER_RETRY_BACKOFF", "0.5"))
+
+# Transient upstream failures worth retrying; 4xx are never retried
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def host_key(url):
+    """Returns the scheme://host[:port] part of a URL, used to pick a pool."""
+    parts = urlsplit(url)
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+
+class SessionPool:
+    """Thread-safe set of per-host sessions with keep-alive and retry/backoff."""
+
+    def __init__(self, headers=None, pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE, max_hosts=POOL_MAX_HOSTS,
+                 retries=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF):
+        self.headers = dict(headers or {})
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_hosts = max_hosts
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # host -> Session, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _build_session(self):
+        # Imported on first use so importing the app does not pay for requests
+        from http.cookiejar import DefaultCookiePolicy
+
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=self.retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            backoff_factor=self.backoff_factor,
+            # Hand the last 5xx back to the caller so raise_for_status() still
+            # produces the usual HTTPError message in scrape_url
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        # No domain may set or receive session cookies; a redirect chain still
+        # carries its own, as with a one-off requests.get()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        session.headers.update(self.headers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def session_for(self, url):
+        """Returns the warm session for the URL's host, creating it on a miss."""
+        key = host_key(url)
+        evicted = None
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                self.hits += 1
+                return session
+
+            self.misses += 1
+            session = self._build_session()
+            self._sessions[key] = session
+            if len(self._sessions) > self.max_hosts:
+                _, evicted = self._sessions.popitem(last=False)
+                self.evictions += 1
+
+        if evicted is not None:
+            evicted.close()
+        return session
+
+    def get(self, url, **kwargs):
+        return self.session_for(url).get(url, **kwargs)
+
+    def stats(self):
+        """Pool hit/miss counters plus connection reuse across all live sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            stats = {
+                "hosts": len(sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+        connections = 0
+        requests_sent = 0
+        for session in sessions:
+            adapter = session.get_adapter("https://")
+            for pool_key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(pool_key)
+                if pool is None:
+                    continue
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+
+        stats["connections_opened"] = connections
+        stats["requests_sent"] = requests_sent
+        stats["connections_reused"] = max(requests_sent - connections, 0)
+        return stats
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
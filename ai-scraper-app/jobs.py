@@ -0,0 +1,163 @@
+"""In-process job queue for long-running extractions.
+
+POST /jobs hands work to a bounded queue drained by a fixed pool of worker
+threads, so request threads return immediately instead of waiting on the fetch
+and the model. No external broker is needed.
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+
+# --- Job Queue Configuration (override via environment) ---
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+# Finished jobs are kept this long for GET /jobs/<id>, then dropped
+JOB_TTL = float(os.getenv("JOB_TTL", "900"))
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the backlog is at capacity."""
+
+
+class JobQueue:
+    """Bounded FIFO of extraction jobs with worker threads and TTL cleanup."""
+
+    def __init__(self, run_fn, workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE, ttl=JOB_TTL):
+        # run_fn(**payload) -> (result dict, http status)
+        self.run_fn = run_fn
+        self.workers = workers
+        self.ttl = ttl
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._metrics = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "expired": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+            "run_total": 0.0,
+        }
+
+    def _ensure_workers(self):
+        # Started on first submit so importing the app never spawns threads
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, payload):
+        """Queues a job and returns its id; raises QueueFull when at capacity."""
+        self._ensure_workers()
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "payload": payload,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "http_status": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+                self._metrics["rejected"] += 1
+            raise QueueFull(f"Job queue is full ({self._queue.maxsize} pending)")
+        with self._lock:
+            self._metrics["submitted"] += 1
+        return job_id
+
+    def get(self, job_id):
+        """Public view of a job (without its payload), or None if unknown/expired."""
+        self.cleanup()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            view = {k: v for k, v in job.items() if k != "payload"}
+        if view["status"] == "queued":
+            view["position"] = self._position(job_id)
+        return view
+
+    def _position(self, job_id):
+        with self._queue.mutex:
+            pending = list(self._queue.queue)
+        return pending.index(job_id) if job_id in pending else 0
+
+    def _worker(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                job["status"] = "running"
+                job["started_at"] = time.time()
+                wait = job["started_at"] - job["submitted_at"]
+                self._metrics["wait_total"] += wait
+                self._metrics["wait_max"] = max(self._metrics["wait_max"], wait)
+                payload = job["payload"]
+
+            try:
+                result, http_status = self.run_fn(**payload)
+            except Exception as e:
+                result, http_status = {"error": f"Job failed: {type(e).__name__} - {e}"}, 500
+
+            with self._lock:
+                job["finished_at"] = time.time()
+                job["result"] = result
+                job["http_status"] = http_status
+                job["status"] = "done" if http_status < 400 else "failed"
+                self._metrics["completed" if http_status < 400 else "failed"] += 1
+                self._metrics["run_total"] += job["finished_at"] - job["started_at"]
+
+    def cleanup(self):
+        """Drops finished jobs older than the TTL."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finished_at"] is not None and job["finished_at"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            self._metrics["expired"] += len(expired)
+
+    def stats(self):
+        with self._lock:
+            m = dict(self._metrics)
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+            tracked = len(self._jobs)
+        started = m["completed"] + m["failed"] + running
+        finished = m["completed"] + m["failed"]
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "running": running,
+            "tracked_jobs": tracked,
+            "workers": self.workers,
+            "submitted": m["submitted"],
+            "rejected": m["rejected"],
+            "completed": m["completed"],
+            "failed": m["failed"],
+            "expired": m["expired"],
+            "wait_avg_seconds": round(m["wait_total"] / started, 4) if started else 0.0,
+            "wait_max_seconds": round(m["wait_max"], 4),
+            "run_avg_seconds": round(m["run_total"] / finished, 4) if finished else 0.0,
+        }
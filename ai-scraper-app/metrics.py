@@ -0,0 +1,156 @@
+"""Per-stage timing spans and counters, exposed in Prometheus text format.
+
+A tiny in-process registry (no prometheus_client dependency): counters and
+histograms keyed by label values, rendered by GET /metrics. stage() also feeds
+a per-request timings dict when the caller asked for one via track_request().
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; Prometheus client defaults plus a couple of long buckets for LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.labels, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labels, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+# --- Registry ---
+
+STAGE_SECONDS = Histogram(
+    "scraper_stage_seconds",
+    "Time spent per pipeline stage (fetch = DNS/connect/TLS until response headers).",
+    labels=("stage",),
+)
+BYTES_DOWNLOADED = Counter("scraper_bytes_downloaded_total", "Response body bytes read from scraped pages.")
+CHARS_EXTRACTED = Counter("scraper_chars_extracted_total", "Characters of visible text extracted from pages.")
+TRUNCATED_PAGES = Counter("scraper_truncated_pages_total", "Response bodies cut off at SCRAPE_MAX_BYTES.")
+TOKENS = Counter("scraper_ai_tokens_total", "Tokens reported by the model API.", labels=("direction",))
+CACHE_EVENTS = Counter("scraper_cache_events_total", "Cache lookups by cache and outcome.", labels=("cache", "result"))
+ERRORS = Counter("scraper_errors_total", "Errors by stage and error class.", labels=("stage", "error"))
+REQUESTS = Counter("scraper_requests_total", "API requests by endpoint and HTTP status.", labels=("endpoint", "status"))
+EXTRACT_SOURCES = Counter("scraper_extract_source_total", "Extractions by the path that answered them.",
+                          labels=("source",))
+COMPACTION_TOKENS = Counter("scraper_compaction_tokens_total", "Tokens of scraped text before and after compaction.",
+                            labels=("stage",))
+COMPACTION_LINES = Counter("scraper_compaction_lines_dropped_total", "Lines removed by compaction, by reason.",
+                           labels=("reason",))
+
+REGISTRY = [STAGE_SECONDS, BYTES_DOWNLOADED, CHARS_EXTRACTED, TRUNCATED_PAGES, TOKENS, CACHE_EVENTS, ERRORS, REQUESTS, EXTRACT_SOURCES,
+            COMPACTION_TOKENS, COMPACTION_LINES]
+
+# A ContextVar rather than a thread-local so concurrent asyncio tasks on one
+# thread (asgi_app) each keep their own timings
+_timings = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def track_request():
+    """Collects stage timings (ms) for the current request context into the yielded dict."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Times a block into scraper_stage_seconds and the current request's timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0.0) + elapsed * 1000, 3)
+
+
+def render():
+    """Whole registry in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
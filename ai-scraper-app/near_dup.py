@@ -0,0 +1,147 @@
+"""Near-duplicate page index for reusing AI results.
+
+Pages that differ only in tracking parameters, timestamps or ad slots give
+almost the same text, which misses the exact-match AI cache. Each extracted
+text gets a 64-bit SimHash over word shingles; a new text whose fingerprint is
+within the configured similarity of one already extracted for the same
+instruction reuses that result instead of calling the model.
+
+Reuse is opt-in (NEAR_DUP_THRESHOLD=0 by default): pages that differ in one
+name or price can still score above 0.95, and would get the other page's
+answer. Hits are reported as "near_dup", never as exact cache hits.
+
+Fingerprints are split into bands and bucketed (LSH), so a lookup only
+compares against entries sharing a band instead of scanning the index.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+# --- Near-Duplicate Configuration (override via environment) ---
+# Minimum fraction of matching fingerprint bits to count as the same page (e.g. 0.95); 0 disables reuse
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0"))
+NEAR_DUP_MAX_ENTRIES = int(os.getenv("NEAR_DUP_MAX_ENTRIES", "10000"))
+# Short texts have too few shingles for a meaningful fingerprint
+NEAR_DUP_MIN_CHARS = int(os.getenv("NEAR_DUP_MIN_CHARS", "500"))
+
+BITS = 64
+SHINGLE_WORDS = 3
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text, shingle_words=SHINGLE_WORDS):
+    """64-bit SimHash of a text's word shingles, weighted by shingle frequency."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < shingle_words:
+        shingles = Counter([" ".join(words)]) if words else Counter()
+    else:
+        shingles = Counter(" ".join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1))
+
+    weights = [0] * BITS
+    for shingle, count in shingles.items():
+        h = _hash64(shingle)
+        for bit in range(BITS):
+            weights[bit] += count if h >> bit & 1 else -count
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def similarity(a, b):
+    """Fraction of equal bits between two fingerprints."""
+    return 1 - bin(a ^ b).count("1") / BITS
+
+
+class NearDupIndex:
+    """Thread-safe LRU of (instruction key, fingerprint) -> result, bucketed by fingerprint bands."""
+
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD, max_entries=NEAR_DUP_MAX_ENTRIES,
+                 min_chars=NEAR_DUP_MIN_CHARS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.min_chars = min_chars
+        # Any two fingerprints within max_distance bits agree exactly on at
+        # least one of max_distance + 1 bands (pigeonhole), so no match is missed.
+        # Low thresholds mean many narrow bands, and lookups approach a full scan.
+        self.max_distance = int(BITS * (1 - threshold)) if threshold > 0 else 0
+        self.bands = min(self.max_distance + 1, BITS)
+        self.band_bits = BITS // self.bands
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # entry id -> (key, fingerprint, result)
+        self._buckets = {}             # (key, band, band value) -> set of entry ids
+        self._next_id = 0
+        self.lookups = 0
+        self.hits = 0
+        self.inserts = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.threshold > 0 and self.max_entries > 0
+
+    def _band_keys(self, key, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(key, band, fingerprint >> (band * self.band_bits) & mask) for band in range(self.bands)]
+
+    def lookup(self, key, text):
+        """Result of the most similar indexed text for this key, or None."""
+        if not self.enabled or len(text) < self.min_chars:
+            return None
+        fingerprint = simhash(text)
+        with self._lock:
+            self.lookups += 1
+            best_id, best_score = None, self.threshold
+            for band_key in self._band_keys(key, fingerprint):
+                for entry_id in self._buckets.get(band_key, ()):
+                    score = similarity(fingerprint, self._entries[entry_id][1])
+                    if score >= best_score:
+                        best_id, best_score = entry_id, score
+            if best_id is None:
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2]
+
+    def add(self, key, text, result):
+        if not self.enabled or len(text) < self.min_chars:
+            return
+        fingerprint = simhash(text)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, fingerprint, result)
+            for band_key in self._band_keys(key, fingerprint):
+                self._buckets.setdefault(band_key, set()).add(entry_id)
+            self.inserts += 1
+            while len(self._entries) > self.max_entries:
+                old_id, (old_key, old_fingerprint, _) = self._entries.popitem(last=False)
+                for band_key in self._band_keys(old_key, old_fingerprint):
+                    bucket = self._buckets.get(band_key)
+                    if bucket is not None:
+                        bucket.discard(old_id)
+                        if not bucket:
+                            del self._buckets[band_key]
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "max_entries": self.max_entries,
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "inserts": self.inserts,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,136 @@
+"""Optional executor for the HTML -> text parse in scrape_url.
+
+Parsing is CPU-bound Python that holds the GIL, so under threaded servers
+concurrent requests take turns on one core. In "process" mode the raw body
+bytes go to a pool of worker processes and only the text (and links) come
+back. Small pages are still parsed inline, where pickling and a round trip
+would cost more than the parse. Workers exit after PARSE_MAX_TASKS_PER_CHILD
+pages so parser memory growth is returned to the OS.
+
+    PARSE_EXECUTOR=process gunicorn -w 2 --threads 8 "app:create_app()"
+    python benchmark.py --scenarios parse-inline parse-thread parse-process
+"""
+
+import os
+import threading
+from concurrent.futures import BrokenExecutor, Future
+
+from parsers import parse_page, selected_backend
+
+# --- Parse Executor Configuration (override via environment) ---
+# inline (parse on the request thread), thread, or process
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "inline")
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Bodies smaller than this are parsed inline whatever the mode
+PARSE_INLINE_BYTES = int(os.getenv("PARSE_INLINE_BYTES", str(32 * 1024)))
+PARSE_MAX_TASKS_PER_CHILD = int(os.getenv("PARSE_MAX_TASKS_PER_CHILD", "200"))
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "30"))
+
+MODES = ("inline", "thread", "process")
+
+
+class ParseExecutor:
+    """Routes parse_page calls inline, to a thread pool or to a process pool by body size."""
+
+    def __init__(self, mode=PARSE_EXECUTOR, workers=PARSE_WORKERS, inline_bytes=PARSE_INLINE_BYTES,
+                 max_tasks_per_child=PARSE_MAX_TASKS_PER_CHILD, timeout=PARSE_TIMEOUT):
+        if mode not in MODES:
+            print(f"⚠️ Unknown PARSE_EXECUTOR '{mode}', parsing inline.")
+            mode = "inline"
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.inline_bytes = inline_bytes
+        self.max_tasks_per_child = max_tasks_per_child
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self.counts = {"inline": 0, "offloaded": 0, "fallbacks": 0, "pool_restarts": 0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.mode == "thread":
+                    from concurrent.futures import ThreadPoolExecutor
+
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parse")
+                else:
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    # Worker recycling is not allowed with fork; forkserver children
+                    # also start without the server's sockets and threads
+                    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(method),
+                        max_tasks_per_child=self.max_tasks_per_child or None,
+                    )
+            return self._pool
+
+    def _restart(self, broken):
+        with self._lock:
+            if self._pool is broken:
+                self._pool = None
+                self.counts["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, content, base_url=None):
+        """Future for (text, links); already resolved when the page is parsed inline."""
+        if self.mode == "inline" or len(content) < self.inline_bytes:
+            with self._lock:
+                self.counts["inline"] += 1
+            return self._inline(content, base_url)
+
+        pool = self._get_pool()
+        with self._lock:
+            self.counts["offloaded"] += 1
+        try:
+            return pool.submit(parse_page, content, selected_backend(), base_url)
+        except BrokenExecutor:
+            # A worker process died; start a fresh pool for the next page
+            self._restart(pool)
+            with self._lock:
+                self.counts["fallbacks"] += 1
+            return self._inline(content, base_url)
+
+    @staticmethod
+    def _inline(content, base_url):
+        future = Future()
+        try:
+            future.set_result(parse_page(content, base_url=base_url))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def parse(self, content, base_url=None):
+        """(text, links) for a page body; links is None unless base_url is given.
+
+        Raises TimeoutError if a worker takes longer than the configured timeout.
+        """
+        future = self.submit(content, base_url)
+        try:
+            return future.result(timeout=self.timeout)
+        except BrokenExecutor:
+            # The pool broke while this page was queued; parse it here instead
+            pool = self._pool
+            if pool is not None:
+                self._restart(pool)
+            with self._lock:
+                self.counts["fallbacks"] += 1
+            return parse_page(content, base_url=base_url)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers if self.mode != "inline" else 0,
+                "inline_bytes": self.inline_bytes,
+                "max_tasks_per_child": self.max_tasks_per_child if self.mode == "process" else None,
+                **self.counts,
+            }
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
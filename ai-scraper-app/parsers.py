@@ -0,0 +1,299 @@
+"""Pluggable HTML -> text backends for scrape_url.
+
+Every backend must return exactly what the original BeautifulSoup/html.parser
+logic returns: script/style/header/footer/nav/aside removed, then each
+non-empty stripped text node joined with newlines. The fixtures under
+fixtures/ pin that output; run `python parsers.py` to check every installed
+backend against them (and time them) before switching the default.
+
+The C parsers (lexbor, libxml2) follow the HTML5 spec, not html.parser: they
+normalize CR/LF, drop CDATA, treat <textarea>/<xmp>/<plaintext> content as
+raw text and ignore nested <form>s. fixtures/edge_cases.html pins those, so
+"auto" only picks them if a future version matches.
+"""
+
+import glob
+import os
+import sys
+import time
+
+from streaming_parse import CHUNK_SIZE, SKIP_TAGS, TextStream, VisibleTextParser
+
+# "auto" takes the first installed backend in AUTO_ORDER whose output matches
+# html.parser on every fixture. The order is fixed rather than timed, so every
+# process picks the same backend (and builds the same AI cache keys).
+PARSER_BACKEND = os.getenv("SCRAPE_PARSER", "auto")
+AUTO_ORDER = ("selectolax", "lxml", "stream", "html.parser")
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def decode_html(content):
+    """Decodes raw bytes the way BeautifulSoup does, so all backends see the same text."""
+    if isinstance(content, str):
+        return content
+    from bs4.dammit import UnicodeDammit
+
+    return UnicodeDammit(content, is_html=True).unicode_markup or ""
+
+
+# --- Backends ---
+
+def html_parser_to_text(content):
+    """Reference implementation: BeautifulSoup with the stdlib html.parser."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+
+    # Remove elements not useful for AI text extraction
+    for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside']):
+        tag.decompose()
+
+    return soup.get_text(separator='\n', strip=True)
+
+
+def stream_to_text(content):
+    """Same tokenizer as html.parser but without building a tree.
+
+    Bytes are fed through TextStream in download-sized chunks, so the fixtures
+    also pin the streaming path's encoding detection.
+    """
+    if isinstance(content, str):
+        parser = VisibleTextParser()
+        parser.feed(content)
+        parser.close()
+        return parser.text()
+    stream = TextStream()
+    for start in range(0, len(content), CHUNK_SIZE):
+        stream.feed(content[start:start + CHUNK_SIZE])
+    return stream.finish()[0]
+
+
+def lxml_to_text(content):
+    from lxml import html as lxml_html
+
+    markup = decode_html(content)
+    if not markup.strip():
+        return ""
+    root = lxml_html.document_fromstring(markup.encode("utf-8"), parser=_lxml_parser())
+
+    parts = []
+
+    def add(text):
+        if text:
+            text = text.strip()
+            if text:
+                parts.append(text)
+
+    def walk(el):
+        # Comments/PIs have non-string tags; their tails are still added by the parent
+        if not isinstance(el.tag, str) or el.tag in SKIP_TAGS:
+            return
+        add(el.text)
+        for child in el:
+            walk(child)
+            add(child.tail)
+
+    walk(root)
+    return "\n".join(parts)
+
+
+_LXML_PARSER = None
+
+
+def _lxml_parser():
+    global _LXML_PARSER
+    if _LXML_PARSER is None:
+        from lxml import html as lxml_html
+        _LXML_PARSER = lxml_html.HTMLParser(encoding="utf-8", remove_comments=False)
+    return _LXML_PARSER
+
+
+def selectolax_to_text(content):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(decode_html(content))
+    tree.strip_tags(list(SKIP_TAGS))
+    parts = []
+    for node in tree.root.traverse(include_text=True) if tree.root else ():
+        if node.tag == "-text":
+            text = node.text_content.strip()
+            if text:
+                parts.append(text)
+    return "\n".join(parts)
+
+
+BACKENDS = {
+    "html.parser": (html_parser_to_text, None),
+    "stream": (stream_to_text, None),
+    "lxml": (lxml_to_text, "lxml"),
+    "selectolax": (selectolax_to_text, "selectolax"),
+}
+
+
+def available_backends():
+    """Backend names whose optional dependency is importable."""
+    names = []
+    for name, (_, module) in BACKENDS.items():
+        if module is not None:
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+        names.append(name)
+    return names
+
+
+# --- Parity and Benchmark ---
+
+def load_fixtures(directory=FIXTURES_DIR):
+    """Returns [(name, html bytes, expected text)] for each fixture with a .txt snapshot."""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        expected_path = path[:-len(".html")] + ".txt"
+        if not os.path.exists(expected_path):
+            continue
+        with open(path, "rb") as f:
+            html = f.read()
+        # newline="" keeps CRs, which html.parser passes through
+        with open(expected_path, "r", encoding="utf-8", newline="") as f:
+            expected = f.read()
+        fixtures.append((os.path.basename(path), html, expected))
+    return fixtures
+
+
+def check_parity(name, fixtures=None):
+    """Returns the fixture names a backend gets wrong (empty list = parity)."""
+    fixtures = load_fixtures() if fixtures is None else fixtures
+    to_text = BACKENDS[name][0]
+    failures = []
+    for fixture_name, html, expected in fixtures:
+        try:
+            if to_text(html) != expected:
+                failures.append(fixture_name)
+        except Exception as e:
+            failures.append(f"{fixture_name} ({type(e).__name__}: {e})")
+    return failures
+
+
+def benchmark(name, fixtures=None, rounds=5):
+    """Best-of-N seconds for one pass of a backend over all fixtures."""
+    fixtures = load_fixtures() if fixtures is None else fixtures
+    to_text = BACKENDS[name][0]
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _, html, _ in fixtures:
+            to_text(html)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def pick_backend(fixtures=None):
+    """First installed backend in AUTO_ORDER that reproduces the reference output on every fixture."""
+    fixtures = load_fixtures() if fixtures is None else fixtures
+    if not fixtures:
+        return "html.parser"
+    installed = available_backends()
+    for name in AUTO_ORDER:
+        if name in installed and not check_parity(name, fixtures):
+            return name
+    return "html.parser"
+
+
+_SELECTED = None
+
+
+def selected_backend():
+    """Name of the backend in use; resolved once per process."""
+    global _SELECTED
+    if _SELECTED is None:
+        name = PARSER_BACKEND
+        if name == "auto":
+            name = pick_backend()
+        elif name not in available_backends():
+            print(f"⚠️ Parser backend '{name}' is not available, falling back to html.parser.")
+            name = "html.parser"
+        _SELECTED = name
+    return _SELECTED
+
+
+def html_to_text(content):
+    """Strips non-content tags from raw HTML and returns the visible text."""
+    return BACKENDS[selected_backend()][0](content)
+
+
+# --- Links ---
+
+def _link_pairs(anchors, base_url):
+    from urllib.parse import urldefrag, urljoin
+
+    links = []
+    for href, rel, text in anchors:
+        href = (href or "").strip()
+        if not href or "nofollow" in (rel or "").lower().split():
+            continue
+        url = urldefrag(urljoin(base_url, href))[0]
+        if url.startswith(("http://", "https://")):
+            links.append((url, " ".join((text or "").split())[:200]))
+    return links
+
+
+def extract_links(content, base_url):
+    """[(absolute http(s) URL, anchor text)] for each followable <a href> in the page."""
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+    except ImportError:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(decode_html(content), "html.parser")
+        base_tag = soup.find("base", href=True)
+        if base_tag:
+            from urllib.parse import urljoin
+            base_url = urljoin(base_url, base_tag["href"])
+        anchors = [(a.get("href"), " ".join(a.get("rel") or []), a.get_text(" "))
+                   for a in soup.find_all("a", href=True)]
+        return _link_pairs(anchors, base_url)
+
+    tree = LexborHTMLParser(decode_html(content))
+    base_tag = tree.css_first("base[href]")
+    if base_tag is not None:
+        from urllib.parse import urljoin
+        base_url = urljoin(base_url, base_tag.attributes.get("href") or "")
+    anchors = [(a.attributes.get("href"), a.attributes.get("rel"), a.text(separator=" "))
+               for a in tree.css("a[href]")]
+    return _link_pairs(anchors, base_url)
+
+
+# --- Worker Entry Point ---
+
+def parse_page(content, backend=None, base_url=None):
+    """(text, links) for one page; links is None unless base_url is given.
+
+    This is the unit of work parse_pool ships to worker processes, so it takes
+    and returns only picklable values. The parent passes its backend name so
+    workers skip the fixture parity check behind "auto".
+    """
+    text = BACKENDS[backend or selected_backend()][0](content)
+    links = extract_links(content, base_url) if base_url is not None else None
+    return text, links
+
+
+if __name__ == "__main__":
+    fixtures = load_fixtures()
+    print(f"{len(fixtures)} fixtures in {FIXTURES_DIR}")
+    failed = False
+    for name in BACKENDS:
+        if name not in available_backends():
+            print(f"  {name:<12} not installed")
+            continue
+        failures = check_parity(name, fixtures)
+        timing = benchmark(name, fixtures)
+        status = "OK" if not failures else f"MISMATCH: {', '.join(failures)}"
+        print(f"  {name:<12} {timing * 1000:8.2f} ms  {status}")
+        # The reference must match its snapshots, and an explicitly configured
+        # backend must match the reference; auto mode skips mismatching ones
+        if failures and name in ("html.parser", PARSER_BACKEND):
+            failed = True
+    print(f"auto would select: {pick_backend(fixtures)}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,275 @@
+"""Cache of extracted page text for scrape_url.
+
+Entries are keyed by normalized URL and hold the clean text (not the raw HTML)
+plus the ETag/Last-Modified validators from the response, so an expired entry
+can be revalidated with a conditional GET and a 304 skips download and parsing.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# --- Cache Configuration (override via environment) ---
+CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", "300"))
+# How long past its TTL an entry is kept around for revalidation
+CACHE_MAX_STALE = float(os.getenv("SCRAPE_CACHE_MAX_STALE", "86400"))
+MEMORY_MAX_ENTRIES = int(os.getenv("SCRAPE_CACHE_MAX_ENTRIES", "512"))
+MEMORY_MAX_BYTES = int(os.getenv("SCRAPE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DISK_DIR = os.getenv("SCRAPE_CACHE_DIR", "")
+DISK_MAX_BYTES = int(os.getenv("SCRAPE_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """Canonical form of a URL: lowercased host, no default port/fragment, sorted query."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def make_entry(text, headers=None, fetched_at=None, partial=False, links=None, metadata=None):
+    headers = headers or {}
+    return {
+        "text": text,
+        # True when parsing stopped early, so text is only a prefix of the page
+        "partial": partial,
+        # [(url, anchor text)] when the page was parsed for links (crawl mode), else None
+        "links": links,
+        # structured.extract_metadata() output when a caller asked for it, else None
+        "metadata": metadata,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "fetched_at": fetched_at if fetched_at is not None else time.time(),
+    }
+
+
+def entry_size(entry):
+    links = entry.get("links") or ()
+    size = len(entry["text"].encode("utf-8")) + sum(len(url) + len(text) + 16 for url, text in links) + 256
+    if entry.get("metadata"):
+        size += len(json.dumps(entry["metadata"]))
+    return size
+
+
+class MemoryStore:
+    """Thread-safe LRU bounded by entry count and total text size."""
+
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES, max_bytes=MEMORY_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        size = entry_size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= entry_size(old)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= entry_size(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= entry_size(old)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskStore:
+    """One JSON file per entry under a directory, pruned oldest-first by total size."""
+
+    def __init__(self, directory, max_bytes=DISK_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key") != key:
+            return None
+        try:
+            os.utime(path)  # mtime doubles as last-access time for pruning
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, entry):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(dict(entry, key=key), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _prune(self):
+        with self._lock:
+            files = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(files):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+class ScrapeCache:
+    """Memory LRU in front of an optional disk store, with TTL and revalidation data."""
+
+    def __init__(self, ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE, memory=None, disk=None):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.memory = memory if memory is not None else MemoryStore()
+        self.disk = disk
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def is_fresh(self, entry, now=None):
+        now = now if now is not None else time.time()
+        return now - entry["fetched_at"] < self.ttl
+
+    def lookup(self, key):
+        """Returns the cached entry (fresh or stale), or None if absent or too old."""
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.put(key, entry)
+        if entry is None:
+            return None
+        if time.time() - entry["fetched_at"] >= self.ttl + self.max_stale:
+            self.delete(key)
+            return None
+        return entry
+
+    def covers(self, entry, max_chars=None, need_links=False, need_metadata=False):
+        """Whether an entry holds enough text for a caller wanting max_chars (None = all).
+
+        need_links / need_metadata: the caller also wants the page's links or
+        structured metadata, which only some entries keep.
+        """
+        if need_links and entry.get("links") is None:
+            return False
+        if need_metadata and entry.get("metadata") is None:
+            return False
+        if not entry.get("partial"):
+            return True
+        return max_chars is not None and len(entry["text"]) >= max_chars
+
+    def store(self, key, text, headers=None, partial=False, links=None, metadata=None):
+        entry = make_entry(text, headers, partial=partial, links=links, metadata=metadata)
+        self.memory.put(key, entry)
+        if self.disk is not None:
+            self.disk.put(key, entry)
+        return entry
+
+    def refresh(self, key, entry, headers=None):
+        """Marks a stale entry fresh again after a 304, keeping the cached text."""
+        headers = headers or {}
+        validators = {
+            "ETag": headers.get("ETag") or entry.get("etag"),
+            "Last-Modified": headers.get("Last-Modified") or entry.get("last_modified"),
+        }
+        self.record("revalidated")
+        return self.store(key, entry["text"], validators, partial=entry.get("partial", False),
+                          links=entry.get("links"), metadata=entry.get("metadata"))
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def record(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "memory_entries": len(self.memory),
+            "disk_enabled": self.disk is not None,
+        }
+
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since headers built from a cached entry's validators."""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def is_cacheable(response):
+    cache_control = response.headers.get("Cache-Control", "").lower()
+    return "no-store" not in cache_control
+
+
+def build_default_cache():
+    disk = DiskStore(DISK_DIR) if DISK_DIR else None
+    return ScrapeCache(disk=disk)
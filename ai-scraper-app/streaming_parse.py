@@ -0,0 +1,254 @@
+"""Incremental visible-text extraction for scrape_url.
+
+Instead of downloading the whole page and building a BeautifulSoup tree, the
+body is decoded and tokenized chunk by chunk, script/style/nav/header/footer/aside
+subtrees are skipped, and reading stops as soon as enough text has been seen.
+Output matches html_to_text(): stripped text nodes joined with newlines.
+
+The encoding is picked from the first chunk with BeautifulSoup's
+EncodingDetector, in the order parsers.decode_html() tries them (byte-order
+mark, <meta>/XML declaration, detected charset, UTF-8, windows-1252). A
+later chunk that does not decode is run through the detector itself, since
+UnicodeDammit would have rejected the encoding for the whole body; pages
+whose first non-ASCII bytes come late can still differ from a full parse
+when the detector's guess depends on text it has not seen. The Content-Type
+charset is ignored on both paths.
+"""
+
+import codecs
+import os
+from html.parser import HTMLParser
+
+# --- Streaming Configuration (override via environment) ---
+# Hard cap on bytes read from any response, streamed or not
+MAX_DOWNLOAD_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", str(5 * 1024 * 1024)))
+CHUNK_SIZE = int(os.getenv("SCRAPE_CHUNK_SIZE", "16384"))
+
+# Same elements html_to_text() decomposes before calling get_text()
+SKIP_TAGS = frozenset(['script', 'style', 'header', 'footer', 'nav', 'aside'])
+# BeautifulSoup gives strings inside these their own class, which get_text() leaves out
+STRING_CONTAINER_TAGS = frozenset(['template', 'rt', 'rp'])
+# Elements BeautifulSoup closes as soon as they open (its empty-element tags)
+VOID_TAGS = frozenset(['area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr',
+                       'image', 'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid',
+                       'param', 'source', 'spacer', 'track', 'wbr'])
+
+
+class VisibleTextParser(HTMLParser):
+    """Collects stripped text nodes outside SKIP_TAGS, optionally stopping early.
+
+    Open elements are tracked the way BeautifulSoup's html.parser tree builder
+    does: an end tag closes everything opened since the matching start tag
+    (and is ignored if there is none), so an unclosed <aside> ends with its
+    parent instead of hiding the rest of the page. Text nodes break where the
+    tree builder would split strings.
+    """
+
+    def __init__(self, max_chars=None):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+        self.done = False
+        self._open = []        # open element names, innermost last
+        self._open_counts = {}
+        self._skipped = 0      # open SKIP_TAGS elements
+        self._contained = 0    # open STRING_CONTAINER_TAGS elements
+        self._closed_voids = []
+        self._buffer = []
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        text = "".join(self._buffer).strip()
+        self._buffer = []
+        if not text:
+            return
+        self.parts.append(text)
+        # +1 for the newline separator between nodes
+        self.length += len(text) + (1 if len(self.parts) > 1 else 0)
+        if self.max_chars is not None and self.length >= self.max_chars:
+            self.done = True
+
+    def _push(self, tag):
+        self._open.append(tag)
+        self._open_counts[tag] = self._open_counts.get(tag, 0) + 1
+        if tag in SKIP_TAGS:
+            self._skipped += 1
+        elif tag in STRING_CONTAINER_TAGS:
+            self._contained += 1
+
+    def _close(self, tag):
+        self._flush()
+        if not self._open_counts.get(tag):
+            return
+        # Pop back to the most recent open element of this name
+        while True:
+            popped = self._open.pop()
+            self._open_counts[popped] -= 1
+            if popped in SKIP_TAGS:
+                self._skipped -= 1
+            elif popped in STRING_CONTAINER_TAGS:
+                self._contained -= 1
+            if popped == tag:
+                return
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        self._push(tag)
+        if tag in VOID_TAGS:
+            self._close(tag)
+            # A later explicit </br> is then ignored once
+            self._closed_voids.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        self._push(tag)
+        self._close(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_voids:
+            self._closed_voids.remove(tag)
+            return
+        self._close(tag)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        # <![CDATA[...]]> is its own text node in the BeautifulSoup tree
+        self._flush()
+        # CDATA keeps its own class inside string containers, so only SKIP_TAGS hide it
+        if data.upper().startswith("CDATA[") and not self._skipped and not self.done:
+            self._buffer.append(data[6:])
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skipped and not self._contained and not self.done:
+            self._buffer.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def text(self):
+        return "\n".join(self.parts)
+
+
+def sniff_encodings(head):
+    """(candidate encodings, BOM length) for a body starting with head, in UnicodeDammit's order.
+
+    The candidates are a lazy iterator: charset detection only runs if the
+    declared encoding (if any) fails.
+    """
+    from bs4.dammit import EncodingDetector
+
+    detector = EncodingDetector(head, is_html=True)
+    return iter(detector.encodings), len(head) - len(detector.markup)
+
+
+def make_decoder(encoding, errors="strict"):
+    try:
+        return codecs.getincrementaldecoder(encoding)(errors=errors)
+    except LookupError:
+        return None
+
+
+def iter_capped(response, max_bytes=MAX_DOWNLOAD_BYTES, chunk_size=CHUNK_SIZE, stats=None):
+    """Yields body chunks until the response ends or max_bytes have been read.
+
+    If a stats dict is passed, stats["truncated"] is set to True when the body
+    was longer than max_bytes.
+    """
+    read = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if not chunk:
+            continue
+        remaining = max_bytes - read
+        if len(chunk) > remaining:
+            if stats is not None:
+                stats["truncated"] = True
+            if remaining:
+                yield chunk[:remaining]
+            return
+        read += len(chunk)
+        yield chunk
+
+
+def read_capped(response, max_bytes=MAX_DOWNLOAD_BYTES, stats=None):
+    """Reads at most max_bytes of a stream=True response body (stats as in iter_capped)."""
+    body = b"".join(iter_capped(response, max_bytes, stats=stats))
+    response.close()
+    return body
+
+
+class TextStream:
+    """Decoder + VisibleTextParser fed one body chunk at a time (sync or async callers)."""
+
+    def __init__(self, max_chars=None):
+        self.parser = VisibleTextParser(max_chars=max_chars)
+        self.decoder = None
+        self.encodings = None
+        self.tried = set()
+        self.fallback = None
+        self.size = 0
+
+    def _next_decoder(self):
+        # Past the last candidate, decode with replacement characters like UnicodeDammit's last resort
+        for encoding in self.encodings:
+            if encoding in self.tried:
+                continue
+            self.tried.add(encoding)
+            decoder = make_decoder(encoding)
+            if decoder is not None:
+                self.fallback = self.fallback or encoding
+                self.decoder = decoder
+                return
+        self.decoder = make_decoder(self.fallback or "utf-8", errors="replace")
+
+    def _decode(self, chunk, final=False):
+        while True:
+            try:
+                return self.decoder.decode(chunk, final)
+            except UnicodeDecodeError:
+                # The whole body would not decode this way either; detect again on the bytes that failed
+                self.encodings, _ = sniff_encodings(chunk)
+                self._next_decoder()
+
+    def feed(self, chunk):
+        """Consumes a chunk; returns True once enough text has been collected."""
+        self.size += len(chunk)
+        if self.decoder is None:
+            self.encodings, bom = sniff_encodings(chunk)
+            chunk = chunk[bom:]
+            self._next_decoder()
+        self.parser.feed(self._decode(chunk))
+        return self.parser.done
+
+    def finish(self):
+        """Flushes pending input; returns (text, cut_off)."""
+        if self.decoder is not None and not self.parser.done:
+            self.parser.feed(self._decode(b"", final=True))
+        self.parser.close()
+        return self.parser.text(), self.parser.done
+
+
+def stream_text(response, max_chars=None, max_bytes=MAX_DOWNLOAD_BYTES, stats=None, raw=None):
+    """Parses a stream=True response incrementally; returns (text, cut_off).
+
+    cut_off is True when reading stopped because max_chars was reached, so the
+    text is only a prefix of what a full parse would produce. If a stats dict
+    is passed, stats["bytes"] is set to the number of body bytes read and
+    stats["truncated"] to True if the body went past max_bytes; if a raw list
+    is passed, the body chunks that were read are appended to it.
+    """
+    stream = TextStream(max_chars=max_chars)
+    for chunk in iter_capped(response, max_bytes, stats=stats):
+        if raw is not None:
+            raw.append(chunk)
+        if stream.feed(chunk):
+            break
+    response.close()
+    if stats is not None:
+        stats["bytes"] = stream.size
+    return stream.finish()
@@ -0,0 +1,324 @@
+"""Deterministic extraction from a page's own structured metadata.
+
+Many pages already describe themselves: JSON-LD blocks, OpenGraph/Twitter
+<meta> tags, schema.org microdata, <title>, <link rel=canonical>. scrape_url
+keeps only the visible text, so extract_metadata() collects these from the raw
+HTML, and answer() fills the requested fields from them. When every field is
+found, /extract returns that without calling the model.
+
+In 'auto' mode only an explicit "fields" list is answered this way: an
+instruction says more than its key names ("the first three sentences as
+'description'", "the title translated into French as 'title'"), and the
+metadata cannot honour that. 'structured' mode also takes the quoted names in
+the instruction ("... with keys 'title' and 'summary'").
+"""
+
+import json
+import os
+import re
+
+# --- Structured Extraction Configuration (override via environment) ---
+# Default /extract mode: auto (metadata when it has every field of an explicit "fields" list, else the model),
+# llm, structured
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "auto")
+
+MODES = ("auto", "llm", "structured")
+FIELD_RE = re.compile(r"""['"`]([A-Za-z_][\w-]{0,63})['"`]""")
+
+DESCRIPTION = [("meta", "og:description"), ("meta", "description"), ("meta", "twitter:description"),
+               ("ld", "description"), ("md", "description")]
+# Field -> lookups tried in order: ("meta", name), ("ld"/"md", dotted path), ("title",), ("canonical",), ("lang",)
+FIELD_SOURCES = {
+    "title": [("meta", "og:title"), ("meta", "twitter:title"), ("ld", "headline"), ("ld", "name"),
+              ("md", "headline"), ("md", "name"), ("title",)],
+    "name": [("ld", "name"), ("md", "name"), ("meta", "og:title"), ("title",)],
+    "summary": DESCRIPTION,
+    "description": DESCRIPTION,
+    "image": [("meta", "og:image"), ("meta", "twitter:image"), ("ld", "image"), ("md", "image")],
+    "url": [("canonical",), ("meta", "og:url"), ("ld", "url"), ("md", "url")],
+    "author": [("ld", "author"), ("md", "author"), ("meta", "author"), ("meta", "article:author")],
+    "published": [("meta", "article:published_time"), ("ld", "datePublished"), ("md", "datePublished")],
+    "modified": [("meta", "article:modified_time"), ("ld", "dateModified"), ("md", "dateModified")],
+    "site_name": [("meta", "og:site_name"), ("meta", "application-name"), ("ld", "publisher")],
+    "type": [("meta", "og:type"), ("ld", "@type"), ("md", "@type")],
+    "keywords": [("meta", "keywords"), ("meta", "news_keywords"), ("ld", "keywords")],
+    "price": [("meta", "product:price:amount"), ("meta", "og:price:amount"), ("ld", "offers.price"),
+              ("ld", "offers.lowPrice"), ("md", "offers.price"), ("md", "price")],
+    "currency": [("meta", "product:price:currency"), ("meta", "og:price:currency"),
+                 ("ld", "offers.priceCurrency"), ("md", "offers.priceCurrency"), ("md", "priceCurrency")],
+    "language": [("lang",), ("meta", "og:locale"), ("ld", "inLanguage")],
+    "rating": [("ld", "aggregateRating.ratingValue"), ("md", "aggregateRating.ratingValue")],
+}
+ALIASES = {
+    "headline": "title", "page_title": "title", "excerpt": "summary", "abstract": "summary",
+    "thumbnail": "image", "image_url": "image", "link": "url", "canonical_url": "url",
+    "date": "published", "date_published": "published", "published_at": "published",
+    "publish_date": "published", "date_modified": "modified", "updated_at": "modified",
+    "site": "site_name", "publisher": "site_name", "tags": "keywords", "lang": "language",
+    "price_currency": "currency", "amount": "price",
+}
+# JSON-LD/microdata items that describe the site or navigation, not the page's subject
+GENERIC_TYPES = {"WebSite", "WebPage", "BreadcrumbList", "SearchAction", "SiteNavigationElement",
+                 "ItemList", "ListItem", "ImageObject"}
+URL_TAGS = {"a": "href", "link": "href", "area": "href", "img": "src", "audio": "src", "video": "src",
+            "source": "src", "iframe": "src", "embed": "src", "object": "data", "time": "datetime",
+            "data": "value", "meter": "value"}
+
+
+# --- Collection ---
+
+def _clean(text):
+    return " ".join((text or "").split())
+
+
+def _ld_items(texts):
+    """JSON-LD nodes from each block, @graph entries flattened; unparsable blocks are skipped."""
+    items = []
+    for text in texts:
+        try:
+            data = json.loads(text, strict=False)
+        except ValueError:
+            continue
+        stack = data if isinstance(data, list) else [data]
+        for node in stack:
+            if not isinstance(node, dict):
+                continue
+            if isinstance(node.get("@graph"), list):
+                items.extend(n for n in node["@graph"] if isinstance(n, dict))
+            else:
+                items.append(node)
+    return items
+
+
+def _microdata(scopes, props):
+    """Top-level microdata items.
+
+    scopes: (scope id, schema type, is itself an itemprop) per itemscope element.
+    props: (owning scope id, name, value, scope id when the property is a nested item).
+    """
+    items = {scope_id: ({"@type": scope_type} if scope_type else {}) for scope_id, scope_type, _ in scopes}
+    for scope_id, name, value, child_id in props:
+        if scope_id not in items:
+            continue
+        if child_id is not None:
+            value = items.get(child_id, {})
+        items[scope_id].setdefault(name, value)
+    return [items[scope_id] for scope_id, _, is_prop in scopes if not is_prop]
+
+
+def _collect_selectolax(markup):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(markup)
+    found = {"metas": [], "ld": [], "props": []}
+    title = tree.css_first("title")
+    found["title"] = _clean(title.text()) if title is not None else None
+    html = tree.css_first("html")
+    found["lang"] = (html.attributes.get("lang") or None) if html is not None else None
+    found["canonical"] = None
+    for link in tree.css("link[rel][href]"):
+        if "canonical" in (link.attributes.get("rel") or "").lower().split():
+            found["canonical"] = link.attributes.get("href")
+            break
+    for meta in tree.css("meta[content]"):
+        attrs = meta.attributes
+        key = attrs.get("property") or attrs.get("name") or attrs.get("itemprop")
+        if key:
+            found["metas"].append((key, attrs.get("content") or ""))
+    for script in tree.css("script[type]"):
+        if (script.attributes.get("type") or "").lower().startswith("application/ld+json"):
+            found["ld"].append(script.text())
+
+    def scope_of(node):
+        parent = node.parent
+        while parent is not None and parent.tag != "-undef":
+            if "itemscope" in parent.attributes:
+                return parent
+            parent = parent.parent
+        return None
+
+    found["scopes"] = [(node.mem_id, _schema_type(node.attributes.get("itemtype")), "itemprop" in node.attributes)
+                       for node in tree.css("[itemscope]")]
+    for node in tree.css("[itemprop]"):
+        attrs = node.attributes
+        scope = scope_of(node)
+        if scope is None:
+            continue
+        child = node.mem_id if "itemscope" in attrs else None
+        value = attrs.get("content")
+        if value is None and node.tag in URL_TAGS:
+            value = attrs.get(URL_TAGS[node.tag])
+        if value is None:
+            value = _clean(node.text(separator=" "))
+        for name in (attrs.get("itemprop") or "").split():
+            found["props"].append((scope.mem_id, name, value, child))
+    return found
+
+
+def _collect_bs4(markup):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(markup, "html.parser")
+    found = {"metas": [], "ld": [], "props": []}
+    found["title"] = _clean(soup.title.get_text()) if soup.title is not None else None
+    found["lang"] = soup.html.get("lang") if soup.html is not None else None
+    link = soup.find("link", rel="canonical", href=True)
+    found["canonical"] = link["href"] if link is not None else None
+    for meta in soup.find_all("meta", content=True):
+        key = meta.get("property") or meta.get("name") or meta.get("itemprop")
+        if key:
+            found["metas"].append((key, meta["content"]))
+    for script in soup.find_all("script", type=True):
+        if script["type"].lower().startswith("application/ld+json"):
+            found["ld"].append(script.string or script.get_text())
+
+    found["scopes"] = [(id(node), _schema_type(node.get("itemtype")), node.has_attr("itemprop"))
+                       for node in soup.find_all(itemscope=True)]
+    for node in soup.find_all(itemprop=True):
+        scope = node.find_parent(itemscope=True)
+        if scope is None:
+            continue
+        child = id(node) if node.has_attr("itemscope") else None
+        value = node.get("content")
+        if value is None and node.name in URL_TAGS:
+            value = node.get(URL_TAGS[node.name])
+        if value is None:
+            value = _clean(node.get_text(" "))
+        for name in (node.get("itemprop") or "").split():
+            found["props"].append((id(scope), name, value, child))
+    return found
+
+
+def _schema_type(itemtype):
+    # "https://schema.org/Product" -> "Product"
+    return (itemtype or "").split()[0].rstrip("/").rsplit("/", 1)[-1] if itemtype else None
+
+
+def extract_metadata(content):
+    """Structured metadata of a page: title, lang, canonical, meta tags, JSON-LD and microdata items."""
+    from parsers import decode_html
+
+    markup = decode_html(content)
+    try:
+        found = _collect_selectolax(markup)
+    except ImportError:
+        found = _collect_bs4(markup)
+
+    meta = {}
+    for key, value in found["metas"]:
+        value = _clean(value)
+        if value:
+            meta.setdefault(key.strip().lower(), value)
+    return {
+        "title": found["title"] or None,
+        "lang": found["lang"],
+        "canonical": found["canonical"],
+        "meta": meta,
+        "json_ld": _ld_items(found["ld"]),
+        "microdata": _microdata(found["scopes"], found["props"]),
+    }
+
+
+# --- Answering ---
+
+def requested_fields(instruction, fields=None, mode="structured"):
+    """Field names the structured path should fill; empty when it cannot answer.
+
+    The explicit list always counts; quoted names in the instruction only in 'structured' mode.
+    """
+    if mode == "llm":
+        return []
+    if fields:
+        return list(dict.fromkeys(fields))
+    if mode != "structured":
+        return []
+    return list(dict.fromkeys(FIELD_RE.findall(instruction or "")))
+
+
+def _norm(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _simplify(value):
+    """Plain value for a JSON-LD/microdata property (Person -> its name, ImageObject -> its url)."""
+    if isinstance(value, list):
+        values = [v for v in (_simplify(v) for v in value) if v not in (None, "")]
+        if not values:
+            return None
+        return values[0] if len(values) == 1 else values
+    if isinstance(value, dict):
+        for key in ("name", "url", "contentUrl", "@id", "value"):
+            if isinstance(value.get(key), (str, int, float)):
+                return value[key]
+        return None
+    if isinstance(value, str):
+        return _clean(value) or None
+    return value
+
+
+def _path(item, dotted):
+    value = item
+    for part in dotted.split("."):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return _simplify(value)
+
+
+def _ranked(items):
+    # The page's subject (Article, Product, ...) before site/navigation items
+    def rank(item):
+        types = item.get("@type")
+        types = types if isinstance(types, list) else [types]
+        return all(t in GENERIC_TYPES for t in types if t) and any(types)
+    return sorted(items, key=rank)
+
+
+def _lookup(metadata, source, items):
+    kind = source[0]
+    if kind == "meta":
+        return metadata["meta"].get(source[1])
+    if kind in ("ld", "md"):
+        for item in items[kind]:
+            value = _path(item, source[1])
+            if value not in (None, ""):
+                return value
+        return None
+    return metadata.get(kind)
+
+
+def _generic(metadata, field, items):
+    """Any item property or meta tag whose name matches the field, ignoring case, '_' and prefixes."""
+    wanted = _norm(field)
+    for item in items["ld"] + items["md"]:
+        for key, value in item.items():
+            if _norm(key) == wanted:
+                value = _simplify(value)
+                if value not in (None, ""):
+                    return value
+    for key, value in metadata["meta"].items():
+        if _norm(key.rsplit(":", 1)[-1]) == wanted:
+            return value
+    return None
+
+
+def answer(metadata, fields):
+    """({field: value} for the fields found, [fields not found])."""
+    items = {"ld": _ranked(metadata["json_ld"]), "md": _ranked(metadata["microdata"])}
+    result, missing = {}, []
+    for field in fields:
+        canonical = ALIASES.get(field.lower(), field.lower())
+        value = None
+        for source in FIELD_SOURCES.get(canonical, ()):
+            value = _lookup(metadata, source, items)
+            if value not in (None, ""):
+                break
+        if value in (None, ""):
+            value = _generic(metadata, field, items)
+        if value in (None, ""):
+            missing.append(field)
+        else:
+            result[field] = value
+    return result, missing
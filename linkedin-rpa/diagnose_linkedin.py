@@ -4,12 +4,19 @@ Run this with your venv active. After login, make sure the Playwright-opened bro
 is the one you scroll — then press Enter in the terminal to run diagnostic.
 This script prints page URL, body text length, and counts + sample outerHTML
 for many candidate selectors LinkedIn uses for posts and comment areas.
+
+Offline mode runs the same selector report on saved HTML (no browser, no network):
+    python diagnose_linkedin.py --snapshot page.html [--expect counts.json]
+Save a snapshot during a live run with --save-snapshot page.html, and the
+report's counts with --json counts.json, to use as the regression baseline.
 """
 
+import argparse
+import json
+import sys
 import time
 import urllib.parse
 from getpass import getpass
-from playwright.sync_api import sync_playwright
 
 SELECTORS_TO_CHECK = [
     "article",
@@ -33,24 +40,148 @@ SELECTORS_TO_CHECK = [
     'div[contenteditable="true"]'
 ]
 
-def print_sample(els, limit=3):
-    out = []
-    for e in els[:limit]:
+SAMPLE_LIMIT = 3
+SAMPLE_HTML_CHARS = 800
+SAMPLE_TEXT_CHARS = 400
+
+# One page.evaluate for the whole report: counts + truncated samples for every
+# selector, body text length and top tags (instead of a round trip per element)
+PROBE_JS = """
+([selectors, limit, htmlChars, textChars]) => {
+  const clip = (s, n) => (s || '').slice(0, n).replace(/\\n/g, ' ');
+  const results = selectors.map(selector => {
+    try {
+      const els = document.querySelectorAll(selector);
+      const samples = Array.from(els).slice(0, limit).map(e => ({
+        html: clip(e.innerHTML, htmlChars),
+        text: clip(e.innerText, textChars),
+      }));
+      return {selector, count: els.length, samples};
+    } catch (err) {
+      return {selector, count: 0, samples: [], error: String(err)};
+    }
+  });
+  const topTags = {};
+  Array.from(document.querySelectorAll('*')).slice(0, 5000)
+    .forEach(n => { topTags[n.tagName] = (topTags[n.tagName]||0) + 1; });
+  return {
+    bodyTextLength: document.body ? document.body.innerText.length : -1,
+    selectors: results,
+    topTags: Object.entries(topTags).sort((a,b)=>b[1]-a[1]).slice(0,12),
+  };
+}
+"""
+
+def probe_page(page):
+    return page.evaluate(PROBE_JS, [SELECTORS_TO_CHECK, SAMPLE_LIMIT, SAMPLE_HTML_CHARS, SAMPLE_TEXT_CHARS])
+
+def probe_html(html):
+    """Same report as probe_page, from saved HTML with a local parser (selectolax, else BeautifulSoup).
+
+    Sample text is the element's text nodes joined by spaces, an approximation
+    of the browser's layout-aware innerText.
+    """
+    def clip(s, n):
+        return (s or "")[:n].replace("\n", " ")
+
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+        tree = LexborHTMLParser(html)
+        select = tree.css
+        inner_html = lambda e: e.inner_html if hasattr(e, "inner_html") else e.html
+        inner_text = lambda e: e.text(separator=" ", strip=True)
+        body_text = tree.body.text() if tree.body else ""
+        all_tags = [n.tag.upper() for n in tree.root.traverse() if not n.tag.startswith("-")] if tree.root else []
+    except ImportError:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        select = soup.select
+        inner_html = lambda e: e.decode_contents()
+        inner_text = lambda e: e.get_text(" ", strip=True)
+        body_text = soup.body.get_text() if soup.body else ""
+        all_tags = [t.name.upper() for t in soup.find_all(True)]
+
+    results = []
+    for selector in SELECTORS_TO_CHECK:
         try:
-            html = e.inner_html()[:800].replace("\n", " ")
-            text = e.inner_text()[:400].replace("\n", " ")
-            out.append({"html": html, "text": text})
+            els = select(selector)
         except Exception as ex:
-            out.append({"error": str(ex)})
-    return out
+            results.append({"selector": selector, "count": 0, "samples": [], "error": str(ex)})
+            continue
+        samples = [{"html": clip(inner_html(e), SAMPLE_HTML_CHARS), "text": clip(inner_text(e), SAMPLE_TEXT_CHARS)}
+                   for e in els[:SAMPLE_LIMIT]]
+        results.append({"selector": selector, "count": len(els), "samples": samples})
+
+    top_tags = {}
+    for tag in all_tags[:5000]:
+        top_tags[tag] = top_tags.get(tag, 0) + 1
+    return {
+        "bodyTextLength": len(body_text),
+        "selectors": results,
+        "topTags": sorted(top_tags.items(), key=lambda kv: -kv[1])[:12],
+    }
+
+def print_report(report, url):
+    print("\nPAGE URL:", url)
+    print("BODY TEXT LENGTH:", report["bodyTextLength"])
+    print("Now checking selectors... (will print count and up to 3 samples for each)\n")
+
+    for result in report["selectors"]:
+        sel = result["selector"]
+        if result.get("error"):
+            print(f"Selector {sel} -> error: {result['error']}")
+            print("-"*60)
+            continue
+        print(f"Selector: {sel} -> count: {result['count']}")
+        for idx, s in enumerate(result["samples"], 1):
+            print(f"  Sample #{idx} text (first 200 chars): {s.get('text','')[:200]}")
+            print(f"  Sample #{idx} html (truncated): {s.get('html','')[:300]}")
+        print("-"*60)
+
+    print("\nTop tag counts (sample):", [list(pair) for pair in report["topTags"]])
+
+def selector_counts(report):
+    return {result["selector"]: result["count"] for result in report["selectors"]}
+
+def check_expected(report, expected_path):
+    """Compares selector counts to a saved {selector: count} file; returns True if they all match."""
+    with open(expected_path, encoding="utf-8") as f:
+        expected = json.load(f)
+    counts = selector_counts(report)
+    mismatches = {sel: (want, counts.get(sel)) for sel, want in expected.items() if counts.get(sel) != want}
+    for sel, (want, got) in mismatches.items():
+        print(f"❌ {sel}: expected {want}, got {got}")
+    if not mismatches:
+        print(f"✅ All {len(expected)} selector counts match {expected_path}")
+    return not mismatches
+
+def finish(report, args):
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(selector_counts(report), f, indent=2)
+        print(f"Selector counts written to {args.json}")
+    if args.expect:
+        return check_expected(report, args.expect)
+    return True
+
+def run_offline(args):
+    ok = True
+    for path in args.snapshot:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            report = probe_html(f.read())
+        print_report(report, path)
+        ok = finish(report, args) and ok
+    return ok
+
+def run_live(args):
+    from playwright.sync_api import sync_playwright
 
-def main():
     email = input("LinkedIn email: ").strip()
     password = getpass("LinkedIn password: ").strip()
     keyword = input("Search keyword (e.g., sports, football): ").strip()
     if not email or not password or not keyword:
         print("All inputs required. Exiting.")
-        return
+        return False
 
     search_url = "https://www.linkedin.com/search/results/content/?keywords=" + urllib.parse.quote(keyword)
 
@@ -96,49 +227,36 @@ def main():
             url = page.url
         except:
             url = "unable to read url"
+
         try:
-            body_text = page.evaluate("() => document.body.innerText.length")
-        except:
-            body_text = -1
-
-        print("\nPAGE URL:", url)
-        print("BODY TEXT LENGTH:", body_text)
-        print("Now checking selectors... (will print count and up to 3 samples for each)\n")
-
-        for sel in SELECTORS_TO_CHECK:
-            try:
-                els = page.query_selector_all(sel)
-                count = len(els)
-                print(f"Selector: {sel} -> count: {count}")
-                if count > 0:
-                    samples = print_sample(els, limit=3)
-                    for idx, s in enumerate(samples, 1):
-                        print(f"  Sample #{idx} text (first 200 chars): {s.get('text','')[:200]}")
-                        print(f"  Sample #{idx} html (truncated): {s.get('html','')[:300]}")
-                print("-"*60)
-            except Exception as e:
-                print(f"Selector {sel} -> error: {e}")
-                print("-"*60)
-
-        # For convenience, print number of total 'article'-like nodes using a JS probe
-        try:
-            probe = page.evaluate("""
-                () => {
-                  const nodes = Array.from(document.querySelectorAll('*'));
-                  const topTags = {};
-                  nodes.slice(0, 5000).forEach(n => { topTags[n.tagName] = (topTags[n.tagName]||0) + 1; });
-                  // return top 12 tags and their counts
-                  return Object.entries(topTags).sort((a,b)=>b[1]-a[1]).slice(0,12);
-                }
-            """)
-            print("\nTop tag counts (sample):", probe)
-        except Exception:
-            pass
+            report = probe_page(page)
+        except Exception as e:
+            print(f"Selector probe failed: {e}")
+            report = None
+        if report is not None:
+            print_report(report, url)
+
+        if args.save_snapshot:
+            with open(args.save_snapshot, "w", encoding="utf-8") as f:
+                f.write(page.content())
+            print(f"Snapshot saved to {args.save_snapshot} (re-run offline with --snapshot)")
 
         print("\nDiagnostic finished. Copy the sample block for any selector that had count>0 and paste here.")
         input("Press Enter to close browser and exit...")
         ctx.close()
         browser.close()
+    return finish(report, args) if report is not None else False
+
+def main():
+    parser = argparse.ArgumentParser(description="LinkedIn DOM selector diagnostic")
+    parser.add_argument("--snapshot", nargs="+", metavar="HTML", help="Run offline against saved HTML files")
+    parser.add_argument("--save-snapshot", metavar="HTML", help="Live mode: save the inspected page's HTML")
+    parser.add_argument("--json", metavar="PATH", help="Write {selector: count} for use with --expect")
+    parser.add_argument("--expect", metavar="PATH", help="Exit 1 if selector counts differ from this file")
+    args = parser.parse_args()
+
+    ok = run_offline(args) if args.snapshot else run_live(args)
+    sys.exit(0 if ok else 1)
 
 if __name__ == "__main__":
     main()
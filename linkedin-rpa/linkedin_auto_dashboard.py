@@ -1,4 +1,5 @@
 import os
+import json
 import time
 import threading
 import uuid
@@ -7,9 +8,11 @@ from datetime import datetime
 from queue import Queue
 
 # Third-party installs
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, render_template_string, request, jsonify
 from playwright.sync_api import sync_playwright
 
+from state_store import StateStore
+
 # Setup OpenAI (Optional)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
 try:
@@ -19,15 +22,22 @@ except:
     openai_client = None
 
 # --- Global State ---
-BOT_STATE = {
+# Shared by the bot thread and request handlers; logs are a bounded ring
+# buffer whose older lines spill to dashboard_logs.log (see state_store.py)
+BOT_STATE = StateStore({
     "is_running": False,
     "status": "Idle",
-    "logs": [],
     "drafts": [], 
     "stats": {"scanned": 0, "target": 0}
-}
+})
 COMMAND_QUEUE = Queue()
 
+# Idle /events streams send a comment this often to keep proxies from closing them
+SSE_KEEPALIVE_SECONDS = 15
+# Log seqs restart with the process, so SSE ids carry this epoch ("<epoch>-<seq>")
+# and a Last-Event-ID from an earlier process is not mistaken for a position in this one
+EVENT_EPOCH = uuid.uuid4().hex[:8]
+
 app = Flask(__name__)
 
 # --- HTML DASHBOARD ---
@@ -102,10 +112,10 @@ HTML_TEMPLATE = """
 
         function stopBot() { fetch('/stop', {method: 'POST'}); }
 
-        setInterval(async () => {
-            const res = await fetch('/status');
-            const data = await res.json();
+        const logBox = document.getElementById('log-container');
+        let runStart = null;
 
+        function renderState(data) {
             if (data.is_running) {
                 document.getElementById('setup-form').style.display = 'none';
                 document.getElementById('stop-area').style.display = 'block';
@@ -116,11 +126,22 @@ HTML_TEMPLATE = """
                 document.getElementById('startBtn').disabled = false;
                 document.getElementById('startBtn').innerText = "🚀 Start Bot";
             }
-            
-            const logBox = document.getElementById('log-container');
-            logBox.innerText = data.logs.join("\\n");
-            logBox.scrollTop = logBox.scrollHeight; 
-        }, 1000);
+            // A new run starts a fresh log
+            if (runStart !== null && data.log_start !== runStart) logBox.textContent = "";
+            runStart = data.log_start;
+        }
+
+        // Only new lines and state changes arrive; on reconnect the browser
+        // sends Last-Event-ID so the server resumes after the last line shown
+        const events = new EventSource('/events');
+        events.addEventListener('state', (e) => renderState(JSON.parse(e.data)));
+        events.addEventListener('log', (e) => {
+            if (!logBox.dataset.live) { logBox.textContent = ""; logBox.dataset.live = "1"; }
+            const line = document.createElement('div');
+            line.textContent = JSON.parse(e.data);
+            logBox.appendChild(line);
+            logBox.scrollTop = logBox.scrollHeight;
+        });
     </script>
 </body>
 </html>
@@ -131,14 +152,57 @@ HTML_TEMPLATE = """
 def index(): return render_template_string(HTML_TEMPLATE)
 
 @app.route("/status")
-def status(): return jsonify(BOT_STATE)
+def status(): return jsonify(dict(status_summary(), last_seq=BOT_STATE.last_seq))
+
+@app.route("/events")
+def events():
+    """Server-Sent Events: `log` for each new line (id = epoch-seq), `state` when the summary changes.
+
+    Resumes after ?since=<seq> or the Last-Event-ID header; without either, or
+    with a cursor from an earlier process, the current run's lines are replayed first.
+    """
+    cursor = request.args.get("since", type=int)
+    if cursor is None:
+        epoch, _, seq = (request.headers.get("Last-Event-ID") or "").rpartition("-")
+        cursor = int(seq) if epoch == EVENT_EPOCH and seq.isdigit() else None
+    if cursor is None or cursor > BOT_STATE.last_seq:
+        cursor = BOT_STATE.run_start - 1
+
+    def stream():
+        nonlocal cursor
+        last_summary = None
+        yield "retry: 2000\n\n"
+        version = BOT_STATE.version
+        while True:
+            lines = BOT_STATE.logs_since(cursor)
+            summary = status_summary()
+            if not lines and summary == last_summary:
+                # Anything that changed since `version` was read ends the wait at once
+                version = BOT_STATE.wait(version, timeout=SSE_KEEPALIVE_SECONDS)
+                lines = BOT_STATE.logs_since(cursor)
+                summary = status_summary()
+            else:
+                version = BOT_STATE.version
+
+            if summary != last_summary:
+                # Sent before the lines so the page can clear the box for a new run
+                yield f"event: state\ndata: {json.dumps(summary)}\n\n"
+                last_summary = summary
+            for seq, line in lines:
+                yield f"id: {EVENT_EPOCH}-{seq}\nevent: log\ndata: {json.dumps(line)}\n\n"
+                cursor = seq
+            if not lines and summary == last_summary:
+                yield ": keep-alive\n\n"
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/start", methods=["POST"])
 def start_route():
     data = request.json
-    if not BOT_STATE["is_running"]:
-        BOT_STATE["is_running"] = True
-        BOT_STATE["logs"] = ["Initializing Stealth Agent..."]
+    # Check-and-set in one step so two quick clicks cannot start two bots
+    if BOT_STATE.compare_and_set("is_running", False, True):
+        BOT_STATE.new_run("Initializing Stealth Agent...")
         
         user_cookie = data.get('cookie')
         user_keyword = data.get('keyword')
@@ -150,13 +214,25 @@ def start_route():
 
 @app.route("/stop", methods=["POST"])
 def stop_route():
-    BOT_STATE["is_running"] = False
+    BOT_STATE.update(is_running=False)
     return jsonify({"msg": "Stopping"})
 
+# --- STATE HELPERS ---
+def status_summary():
+    """BOT_STATE without the log history (the `state` event payload)."""
+    state = BOT_STATE.snapshot()
+    return {
+        "is_running": state["is_running"],
+        "status": state["status"],
+        "stats": state["stats"],
+        "drafts": len(state["drafts"]),
+        "log_start": BOT_STATE.run_start,
+    }
+
 # --- BOT LOGIC ---
 def log(msg):
     t = datetime.now().strftime("%H:%M:%S")
-    BOT_STATE["logs"].append(f"[{t}] {msg}")
+    BOT_STATE.log(f"[{t}] {msg}")
     print(msg)
 
 def bot_logic(cookie, keyword):
@@ -250,7 +326,7 @@ def bot_logic(cookie, keyword):
         if browser: 
             try: browser.close()
             except: pass
-        BOT_STATE["is_running"] = False
+        BOT_STATE.update(is_running=False)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
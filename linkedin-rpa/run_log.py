@@ -0,0 +1,213 @@
+"""Append-only run log for bot activity (comments drafted, posted, failed).
+
+Replaces the comments_log.csv / comments_log.json / linkedin_comments_log.json
+files: rows are inserted into one SQLite table and never rewritten, and the
+(ts, status) indexes let time-range and per-status queries, including the
+hourly failure rate, read only the index instead of the whole history.
+
+    python run_log.py import                 # the three legacy files next to this script
+    python run_log.py import other.json      # any file in one of those formats
+    python run_log.py stats [--since 2025-11-18T00]
+"""
+
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RUN_LOG_PATH = os.getenv("RUN_LOG_PATH", os.path.join(HERE, "run_log.sqlite3"))
+LEGACY_FILES = ("comments_log.csv", "comments_log.json", "linkedin_comments_log.json")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,            -- ISO 8601, sorts chronologically as text
+    status TEXT NOT NULL,        -- posted / failed / drafted / skipped ...
+    action TEXT NOT NULL,
+    target TEXT,                 -- post URL or the post key the bot matched on
+    draft TEXT,
+    note TEXT,
+    source TEXT NOT NULL,        -- 'bot' or the file a row was imported from
+    fingerprint TEXT NOT NULL UNIQUE
+);
+-- Covering indexes: range scans and per-hour/per-status counts never touch the table
+CREATE INDEX IF NOT EXISTS idx_events_ts_status ON events (ts, status);
+CREATE INDEX IF NOT EXISTS idx_events_status_ts ON events (status, ts);
+"""
+
+
+def normalize_ts(value):
+    """ISO 8601 text for a timestamp given as datetime, epoch seconds or ISO string."""
+    if value is None:
+        return datetime.now().isoformat()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).isoformat()
+    return datetime.fromisoformat(str(value).strip().replace(" ", "T")).isoformat()
+
+
+def fingerprint(ts, status, action, target, draft):
+    """Identity of an event, so importing the same file twice adds nothing."""
+    raw = json.dumps([ts, status, action, target or "", draft or ""], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RunLog:
+    """SQLite-backed append-only event log with indexed queries."""
+
+    def __init__(self, path=RUN_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    # --- Writes (insert only) ---
+
+    def _insert(self, rows):
+        """Inserts (ts, status, action, target, draft, note, source) rows; returns how many were new."""
+        records = [row + (fingerprint(*row[:5]),) for row in rows]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO events (ts, status, action, target, draft, note, source, fingerprint) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                records,
+            )
+            return self._conn.total_changes - before
+
+    def append(self, status, action="comment", target=None, draft=None, note="", timestamp=None, source="bot"):
+        """Records one event; returns False if an identical event is already logged."""
+        row = (normalize_ts(timestamp), status, action, target, draft, note or "", source)
+        return self._insert([row]) == 1
+
+    def import_file(self, path):
+        """Imports a legacy CSV or JSON-array log file; returns the number of new rows."""
+        source = os.path.basename(path)
+        if path.endswith(".csv"):
+            with open(path, newline="", encoding="utf-8") as f:
+                records = list(csv.DictReader(f))
+        else:
+            with open(path, encoding="utf-8") as f:
+                records = json.load(f)
+
+        rows = []
+        for record in records:
+            if not record.get("timestamp") or not record.get("status"):
+                continue
+            rows.append((
+                normalize_ts(record["timestamp"]),
+                record["status"],
+                record.get("action") or "comment",
+                record.get("url") or record.get("key_or_url") or None,
+                record.get("draft"),
+                record.get("note") or "",
+                source,
+            ))
+        return self._insert(rows)
+
+    def import_legacy(self, directory=HERE):
+        """Imports whichever of the three legacy log files exist; returns {file: new rows}."""
+        imported = {}
+        for name in LEGACY_FILES:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                imported[name] = self.import_file(path)
+        return imported
+
+    # --- Queries ---
+
+    @staticmethod
+    def _range(since, until, clauses, params):
+        # Strings are compared as-is, so prefixes like "2025-11-18T15" work as bounds
+        for op, value in ((">=", since), ("<", until)):
+            if value is not None:
+                clauses.append(f"ts {op} ?")
+                params.append(value if isinstance(value, str) else normalize_ts(value))
+
+    def query(self, status=None, since=None, until=None, limit=100):
+        """Events newest first, filtered by status and [since, until) on the timestamp."""
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        self._range(since, until, clauses, params)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, ts, status, action, target, draft, note, source FROM events {where} "
+                "ORDER BY ts DESC LIMIT ?", params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts_by_status(self, since=None, until=None):
+        clauses, params = [], []
+        self._range(since, until, clauses, params)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT status, COUNT(*) FROM events {where} GROUP BY status", params
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def failure_rate_by_hour(self, since=None, until=None, failed_statuses=("failed",)):
+        """[{hour, total, failed, failure_rate}] per hour (YYYY-MM-DDTHH), oldest first."""
+        clauses, params = [], []
+        self._range(since, until, clauses, params)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        marks = ", ".join("?" for _ in failed_statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT substr(ts, 1, 13) AS hour, COUNT(*), SUM(status IN ({marks})) "
+                f"FROM events {where} GROUP BY hour ORDER BY hour",
+                list(failed_statuses) + params,
+            ).fetchall()
+        return [
+            {"hour": hour, "total": total, "failed": failed, "failure_rate": round(failed / total, 4)}
+            for hour, total, failed in rows
+        ]
+
+    def explain(self, sql, params=()):
+        """EXPLAIN QUERY PLAN details, to confirm a query is answered from an index."""
+        with self._lock:
+            return [row[-1] for row in self._conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bot run log")
+    parser.add_argument("--db", default=RUN_LOG_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="Import legacy CSV/JSON log files")
+    importer.add_argument("files", nargs="*")
+    stats = commands.add_parser("stats", help="Counts by status and failure rate per hour")
+    stats.add_argument("--since")
+    stats.add_argument("--until")
+    args = parser.parse_args()
+
+    run_log = RunLog(args.db)
+    if args.command == "import":
+        if args.files:
+            imported = {os.path.basename(path): run_log.import_file(path) for path in args.files}
+        else:
+            imported = run_log.import_legacy()
+        for name, count in imported.items():
+            print(f"✅ {name}: {count} new rows")
+    else:
+        print(json.dumps(run_log.counts_by_status(args.since, args.until)))
+        for row in run_log.failure_rate_by_hour(args.since, args.until):
+            print(f"{row['hour']}  {row['failed']:>4}/{row['total']:<4}  {row['failure_rate']:.1%}")
+    run_log.close()
@@ -0,0 +1,137 @@
+"""Thread-safe bot state for the dashboard.
+
+One lock guards the state fields and the log, so the bot thread and the Flask
+handlers never see a half-applied update. Log lines live in a fixed-size ring
+buffer with increasing sequence numbers; lines pushed out of it are appended
+to a rotating file, so memory stays flat however long the bot runs.
+"""
+
+import copy
+import logging
+import os
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+# --- Store Configuration (override via environment) ---
+LOG_CAPACITY = int(os.getenv("DASHBOARD_LOG_CAPACITY", "1000"))
+# Set DASHBOARD_LOG_FILE to an empty string to drop old lines instead
+LOG_FILE = os.getenv("DASHBOARD_LOG_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard_logs.log"))
+LOG_FILE_MAX_BYTES = int(os.getenv("DASHBOARD_LOG_FILE_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.getenv("DASHBOARD_LOG_FILE_BACKUPS", "3"))
+
+
+def _overflow_logger(path, max_bytes, backups):
+    if not path:
+        return None
+    logger = logging.getLogger(f"dashboard.overflow.{path}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+
+class StateStore:
+    """Dict-like state plus a numbered log ring buffer, all behind one Condition."""
+
+    def __init__(self, initial, log_capacity=LOG_CAPACITY, log_file=LOG_FILE,
+                 log_file_max_bytes=LOG_FILE_MAX_BYTES, log_file_backups=LOG_FILE_BACKUPS):
+        self._cond = threading.Condition()
+        self._state = copy.deepcopy(initial)
+        self._logs = deque(maxlen=max(1, log_capacity))  # (seq, line)
+        self._next_seq = 1
+        self._run_start = 1
+        # Bumped on every change so waiters can tell whether anything happened
+        self._version = 0
+        self._overflow = _overflow_logger(log_file, log_file_max_bytes, log_file_backups)
+
+    def _changed(self):
+        self._version += 1
+        self._cond.notify_all()
+
+    # --- State fields ---
+
+    def get(self, key, default=None):
+        with self._cond:
+            return copy.deepcopy(self._state.get(key, default))
+
+    def __getitem__(self, key):
+        with self._cond:
+            return copy.deepcopy(self._state[key])
+
+    def update(self, **changes):
+        with self._cond:
+            self._state.update(copy.deepcopy(changes))
+            self._changed()
+
+    def compare_and_set(self, key, expected, value):
+        """Sets key to value only if it currently equals expected; returns whether it did."""
+        with self._cond:
+            if self._state.get(key) != expected:
+                return False
+            self._state[key] = value
+            self._changed()
+            return True
+
+    def snapshot(self):
+        """A consistent deep copy of the state fields (without the log)."""
+        with self._cond:
+            return copy.deepcopy(self._state)
+
+    # --- Log ---
+
+    def log(self, line):
+        """Appends a line and returns its sequence number."""
+        with self._cond:
+            seq = self._next_seq
+            self._next_seq += 1
+            if len(self._logs) == self._logs.maxlen:
+                old_seq, old_line = self._logs[0]
+                if self._overflow is not None:
+                    self._overflow.info(f"{old_seq}\t{old_line}")
+            self._logs.append((seq, line))
+            self._changed()
+            return seq
+
+    def new_run(self, first_line=None):
+        """Starts a fresh log view: logs_since() only returns lines from here on."""
+        with self._cond:
+            self._run_start = self._next_seq
+            self._changed()
+        if first_line is not None:
+            self.log(first_line)
+
+    def logs_since(self, seq):
+        """[(seq, line)] of the current run numbered above seq that are still in memory."""
+        with self._cond:
+            first = max(seq + 1, self._run_start)
+            if not self._logs or first > self._logs[-1][0]:
+                return []
+            start = max(first - self._logs[0][0], 0)
+            return [self._logs[i] for i in range(start, len(self._logs))]
+
+    @property
+    def run_start(self):
+        with self._cond:
+            return self._run_start
+
+    @property
+    def last_seq(self):
+        with self._cond:
+            return self._next_seq - 1
+
+    # --- Change notification ---
+
+    @property
+    def version(self):
+        with self._cond:
+            return self._version
+
+    def wait(self, version, timeout=None):
+        """Blocks until something changed after `version` (or timeout); returns the current version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version, timeout=timeout)
+            return self._version